@@ -1,6 +1,52 @@
+from contextlib import nullcontext
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Category, Product, Land, Input, Service, Video
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+from .models import User, Category, Product, Land, Input, Service, Video, Order, OrderLine, ArchivedListing, ProfileReport
+
+
+def estimated_row_count(model, using):
+    """Return the planner's row estimate for ``model``'s table, or None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+    elif connection.vendor == 'mysql':
+        sql = 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s'
+    elif connection.vendor == 'sqlite':
+        # Only populated once ANALYZE has been run; every index row of a
+        # table starts with the table's row count.
+        sql = 'SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    else:
+        return None
+    # The savepoint keeps a failed lookup from breaking an enclosing
+    # transaction. Outside one it isn't needed, and on SQLite it would take
+    # the write lock (see DATABASES in settings).
+    guard = transaction.atomic(using=using) if connection.in_atomic_block else nullcontext()
+    try:
+        with guard, connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that skips COUNT(*) on large, unfiltered changelists."""
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimated_row_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate > self.exact_count_threshold:
+                return estimate
+        return super().count
 
 # Custom User Admin
 class CustomUserAdmin(UserAdmin):
@@ -9,7 +55,7 @@ class CustomUserAdmin(UserAdmin):
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
         ('Personal Info', {'fields': ('first_name', 'last_name', 'email')}),
-        ('Verification', {'fields': ('is_email_verified', 'verification_code')}),
+        ('Verification', {'fields': ('is_email_verified',)}),
         ('Permissions', {
             'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions'),
         }),
@@ -22,47 +68,122 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
+# Category Admin, searchable so listing admins can autocomplete it
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
+# Shared settings for the large listing tables. Searches are case-sensitive
+# prefix matches on indexed columns (core.lookups.Prefix) plus an exact
+# username match, all of which can use an index; the admin's '^' and '='
+# shortcuts would ignore case and so scan the table.
+class ListingAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 # Product Admin with improved display
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ListingAdmin):
     list_display = ('name', 'user', 'category', 'price', 'quantity', 'created_at')
     list_filter = ('category', 'created_at')
-    search_fields = ('name', 'description', 'user__username')
-    raw_id_fields = ('user',)
+    list_select_related = ('user', 'category')
+    search_fields = ('name__prefix', 'user__username__exact')
+    autocomplete_fields = ('user', 'category')
     date_hierarchy = 'created_at'
 
 # Land Admin
-class LandAdmin(admin.ModelAdmin):
+class LandAdmin(ListingAdmin):
     list_display = ('title', 'user', 'location', 'price', 'size', 'is_for_sale', 'created_at')
     list_filter = ('is_for_sale', 'created_at')
-    search_fields = ('title', 'description', 'location', 'user__username')
-    raw_id_fields = ('user',)
+    search_fields = ('title__prefix', 'location__prefix', 'user__username__exact')
 
 # Input Admin
-class InputAdmin(admin.ModelAdmin):
+class InputAdmin(ListingAdmin):
     list_display = ('name', 'user', 'price', 'quantity', 'created_at')
-    search_fields = ('name', 'description', 'user__username')
+    search_fields = ('name__prefix', 'user__username__exact')
     list_filter = ('created_at',)
-    raw_id_fields = ('user',)
 
 # Service Admin
-class ServiceAdmin(admin.ModelAdmin):
+class ServiceAdmin(ListingAdmin):
     list_display = ('title', 'user', 'location', 'price', 'created_at')
-    search_fields = ('title', 'description', 'location', 'user__username')
+    search_fields = ('title__prefix', 'location__prefix', 'user__username__exact')
     list_filter = ('created_at',)
-    raw_id_fields = ('user',)
 
 # Video Admin
-class VideoAdmin(admin.ModelAdmin):
+class VideoAdmin(ListingAdmin):
     list_display = ('title', 'user', 'youtube_video_id', 'created_at')
-    search_fields = ('title', 'description', 'user__username')
+    search_fields = ('title__prefix', 'user__username__exact')
     list_filter = ('created_at',)
-    raw_id_fields = ('user',)
+
+# Order Admin
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    raw_id_fields = ('product', 'input')
+    extra = 0
+
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'expires_at', 'created_at')
+    list_filter = ('status',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    inlines = [OrderLineInline]
+
+# Archived listings are read-only; the action puts them back live
+class ArchivedListingAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'listing_id', 'user', 'archived_at')
+    list_filter = ('kind',)
+    list_select_related = ('user',)
+    search_fields = ('=listing_id', '=user__username')
+    readonly_fields = ('kind', 'listing_id', 'user', 'data', 'archived_at')
+    actions = ['restore']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Restore selected listings')
+    def restore(self, request, queryset):
+        for archived in queryset:
+            archived.restore()
+        self.message_user(request, f'Restored {len(queryset)} listing(s)')
+
+# Profiling reports are written by core.profiling and only ever read here
+class ProfileReportAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'sql_ms', 'user')
+    list_filter = ('method', 'status_code')
+    list_select_related = ('user',)
+    search_fields = ('^path',)
+    date_hierarchy = 'created_at'
+    fields = ('user', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'sql_ms',
+              'created_at', 'profile_output', 'sql')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Profile')
+    def profile_output(self, obj):
+        return format_html('<pre>{}</pre>', obj.profile)
+
+    @admin.display(description='SQL')
+    def sql(self, obj):
+        return format_html_join(
+            '', '<pre>[{}] {} ms\n{}\n{}\n{}</pre>',
+            ((query['alias'], query['ms'], query['sql'], query['params'], query.get('explain', ''))
+             for query in sorted(obj.queries, key=lambda query: -query['ms'])),
+        )
 
 # Register your models here
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(Category)
+admin.site.register(Category, CategoryAdmin)
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Land, LandAdmin)
 admin.site.register(Input, InputAdmin)
 admin.site.register(Service, ServiceAdmin)
-admin.site.register(Video, VideoAdmin)
\ No newline at end of file
+admin.site.register(Video, VideoAdmin)
+admin.site.register(Order, OrderAdmin)
+admin.site.register(ArchivedListing, ArchivedListingAdmin)
+admin.site.register(ProfileReport, ProfileReportAdmin)
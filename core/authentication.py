@@ -0,0 +1,86 @@
+# core/authentication.py
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class LazyTokenUser(SimpleLazyObject):
+    """A user that is only loaded from the database when a view needs it.
+
+    Permission checks only look at ``is_authenticated`` and the primary key,
+    both of which come straight from the validated token.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id):
+        def load():
+            User = get_user_model()
+            try:
+                user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            if not user.is_active:
+                raise AuthenticationFailed('User is inactive', code='user_inactive')
+            return user
+
+        self.__dict__['_token_user_id'] = user_id
+        super().__init__(load)
+
+    def __bool__(self):
+        return True
+
+    @property
+    def pk(self):
+        return self.__dict__['_token_user_id']
+
+    id = pk
+
+
+def deactivated_key(user_id):
+    return f'auth:deactivated:{user_id}'
+
+
+def mark_deactivated(user_id):
+    """Reject access tokens issued to ``user_id`` before now.
+
+    The mark only has to outlive the access tokens it covers; refresh tokens
+    are checked against the user table when they are used.
+    """
+    cache.set(deactivated_key(user_id), time.time(), api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+def clear_deactivated(user_id):
+    cache.delete(deactivated_key(user_id))
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT authentication that does not query the user table per request.
+
+    Deactivated users are caught by a cache lookup instead (see
+    `mark_deactivated`), and again if a view loads the user.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed('Token contained no recognizable user identification')
+        deactivated_at = cache.get(deactivated_key(user_id))
+        if deactivated_at is not None and validated_token.get('iat', 0) < deactivated_at:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return LazyTokenUser(user_id)
+
+
+def issue_tokens(user):
+    refresh = RefreshToken.for_user(user)
+    return {
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+    }
@@ -0,0 +1,309 @@
+# core/autocomplete.py
+"""In-memory suggestions for the /api/autocomplete/ endpoint.
+
+Suggestions are the distinct listing titles (product and input names, land,
+service and video titles). Each title is indexed by its words in two ways:
+
+* a sorted word list, searched with ``bisect``, for prefix matches (a
+  compact stand-in for a trie: one Python string per word, not a node per
+  character), and
+* a trigram -> words map, used when the prefix finds too few titles, so
+  misspellings like "tomatos" or "maiz" still match.
+
+The index is built once per worker (gunicorn builds it in the master before
+forking, see kilimopesa/gunicorn_config.py) and kept current from the
+listing signals. Other workers catch up through the response cache
+generation tokens, like core.similarity, and rebuild fully about every
+AUTOCOMPLETE_REBUILD_SECONDS to drop titles deleted elsewhere. The rebuild
+runs in a background thread while the old index keeps answering, and each
+worker draws its own point in the interval (redrawn when it forks) so they
+don't all rebuild at once. At most AUTOCOMPLETE_MAX_TITLES distinct titles
+are held; the most common are kept.
+
+Words shorter than MIN_PREFIX characters are never looked up on their own: a
+single letter matches most of the index. "white m" still works, by checking
+the letter against the titles "white" finds.
+"""
+import bisect
+import random
+import re
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+from . import response_cache
+from .models import Input, Land, Product, Service, Video
+
+# Listing type -> (model, title field)
+SOURCES = {
+    'products': (Product, 'name'),
+    'inputs': (Input, 'name'),
+    'lands': (Land, 'title'),
+    'services': (Service, 'title'),
+    'videos': (Video, 'title'),
+}
+KIND_BITS = {kind: 1 << bit for bit, kind in enumerate(SOURCES)}
+WORD_RE = re.compile(r'\w+')
+SYNC_OVERLAP = timedelta(seconds=5)
+MIN_SIMILARITY = 0.4
+MIN_PREFIX = 2
+# Rebuilds fall at a random point in the last half of the interval.
+REBUILD_JITTER = 0.5
+
+
+def words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.titles = {}        # normalised title -> [display text, listing count, kind bits]
+        self.title_words = {}   # normalised title -> its distinct words
+        self.word_titles = {}   # word -> normalised titles containing it
+        self.sorted_words = []
+        self.word_trigrams = {}  # trigram -> words containing it
+        self.listings = {}      # (kind, pk) -> normalised title
+        self.synced_at = None
+        self.rebuild_at = 0
+        self.rebuilding = False
+        self.generations = None
+        self.checked_at = 0
+
+    # Mutation; callers hold the lock.
+
+    def add(self, kind, pk, text):
+        key = ' '.join(words(text or ''))
+        if not key:
+            return
+        entry = self.titles.get(key)
+        if entry is None:
+            if len(self.titles) >= settings.AUTOCOMPLETE_MAX_TITLES:
+                return  # Over budget until the next rebuild
+            entry = self.titles[key] = [text.strip(), 0, 0]
+            self.title_words[key] = set(words(text))
+            for word in self.title_words[key]:
+                titles = self.word_titles.get(word)
+                if titles is None:
+                    titles = self.word_titles[word] = set()
+                    bisect.insort(self.sorted_words, word)
+                    for gram in trigrams(word):
+                        self.word_trigrams.setdefault(gram, set()).add(word)
+                titles.add(key)
+        entry[1] += 1
+        entry[2] |= KIND_BITS[kind]
+        self.listings[(kind, pk)] = key
+
+    def remove(self, kind, pk):
+        key = self.listings.pop((kind, pk), None)
+        if key is None:
+            return
+        entry = self.titles[key]
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del self.titles[key]
+        for word in self.title_words.pop(key):
+            titles = self.word_titles[word]
+            titles.discard(key)
+            if not titles:
+                del self.word_titles[word]
+                del self.sorted_words[bisect.bisect_left(self.sorted_words, word)]
+                for gram in trigrams(word):
+                    self.word_trigrams[gram].discard(word)
+
+    def update(self, kind, pk, text):
+        if self.listings.get((kind, pk)) == ' '.join(words(text or '')):
+            return
+        self.remove(kind, pk)
+        self.add(kind, pk, text)
+
+    # Loading
+
+    def current_generations(self):
+        keys = [response_cache.generation_key(model) for model, _ in SOURCES.values()]
+        return dict(zip(SOURCES, response_cache.get_generations(keys)))
+
+    def schedule(self):
+        interval = settings.AUTOCOMPLETE_REBUILD_SECONDS
+        self.rebuild_at = time.monotonic() + interval * random.uniform(1 - REBUILD_JITTER, 1)
+
+    def load(self):
+        """Read a fresh index from the database."""
+        fresh = AutocompleteIndex()
+        fresh.synced_at = timezone.now()
+        fresh.generations = self.current_generations()
+        # Most common titles first, so the budget keeps those.
+        counts = []
+        for model, field in SOURCES.values():
+            rows = model.objects.values(field).annotate(n=Count('pk')).values_list(field, 'n')
+            counts.extend(rows.iterator())
+        allowed = set()
+        for title, _ in sorted(counts, key=lambda row: -row[1]):
+            key = ' '.join(words(title or ''))
+            if key and (key in allowed or len(allowed) < settings.AUTOCOMPLETE_MAX_TITLES):
+                allowed.add(key)
+        for kind, (model, field) in SOURCES.items():
+            for pk, title in model.objects.values_list('pk', field).iterator():
+                if ' '.join(words(title or '')) in allowed:
+                    fresh.add(kind, pk, title)
+        return fresh
+
+    def build(self):
+        fresh = self.load()
+        with self.lock:
+            self.__dict__.update({name: value for name, value in fresh.__dict__.items() if name != 'lock'})
+            self.checked_at = time.monotonic()
+            self.schedule()
+        return self
+
+    def rebuild(self):
+        try:
+            self.build()
+        finally:
+            self.rebuilding = False
+            # The thread's own connections; nothing else will close them.
+            connections.close_all()
+
+    def sync(self):
+        """Catch up with saves made by other workers; rebuild when due."""
+        now = time.monotonic()
+        if now > self.rebuild_at and not self.rebuilding:
+            with self.lock:
+                start = not self.rebuilding
+                self.rebuilding = True
+            if start:
+                threading.Thread(target=self.rebuild, name='autocomplete-rebuild', daemon=True).start()
+        if now - self.checked_at < 1:
+            return
+        self.checked_at = now
+        generations = self.current_generations()
+        changed = [kind for kind in SOURCES if generations[kind] != self.generations.get(kind)]
+        if not changed:
+            return
+        synced_at = timezone.now()
+        for kind in changed:
+            model, field = SOURCES[kind]
+            rows = model.objects.filter(updated_at__gte=self.synced_at - SYNC_OVERLAP).values_list('pk', field)
+            rows = list(rows.iterator())
+            with self.lock:
+                for pk, title in rows:
+                    self.update(kind, pk, title)
+        with self.lock:
+            self.synced_at, self.generations = synced_at, generations
+
+    # Querying
+
+    def suggest(self, query, limit=8):
+        """Return up to ``limit`` suggestions for ``query``, best first."""
+        query_words = words(query)
+        if not query_words:
+            return []
+        *leading, last = query_words
+        # Single letters would match most of the index.
+        leading = [word for word in leading if len(word) >= MIN_PREFIX]
+        if len(last) < MIN_PREFIX and not leading:
+            return []
+        with self.lock:
+            if len(last) >= MIN_PREFIX:
+                candidates = self.prefixed(last)
+                fuzzy = False
+                if len(candidates) < limit and len(last) >= 3:
+                    candidates = candidates | self.similar(last)
+                    fuzzy = True
+                for word in leading:
+                    candidates &= self.prefixed(word) | (self.similar(word) if fuzzy else set())
+            else:
+                # "white m": narrow by the whole words, then check the letter
+                # against the few titles left.
+                candidates = self.prefixed(leading[0])
+                for word in leading[1:]:
+                    candidates &= self.prefixed(word)
+                candidates = {key for key in candidates
+                              if any(word.startswith(last) for word in self.title_words[key])}
+            phrase = ' '.join(query_words)
+            ranked = sorted(
+                candidates,
+                key=lambda key: (not key.startswith(phrase), not key.startswith(last), -self.titles[key][1], key),
+            )[:limit]
+            return [
+                {
+                    'text': self.titles[key][0],
+                    'kinds': [kind for kind, bit in KIND_BITS.items() if self.titles[key][2] & bit],
+                    'count': self.titles[key][1],
+                }
+                for key in ranked
+            ]
+
+    def prefixed(self, prefix):
+        titles = set()
+        start = bisect.bisect_left(self.sorted_words, prefix)
+        for word in self.sorted_words[start:]:
+            if not word.startswith(prefix):
+                break
+            titles |= self.word_titles[word]
+        return titles
+
+    def similar(self, word):
+        grams = trigrams(word)
+        shared = {}
+        for gram in grams:
+            for candidate in self.word_trigrams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        titles = set()
+        for candidate, count in shared.items():
+            # A word has len + 2 padded trigrams (fewer only when some repeat).
+            if count / (len(grams) + len(candidate) + 2 - count) >= MIN_SIMILARITY:
+                titles |= self.word_titles[candidate]
+        return titles
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = AutocompleteIndex().build()
+    _index.sync()
+    return _index
+
+
+def reschedule():
+    # Called in each new worker, which would otherwise inherit the master's
+    # schedule: workers forked together would all rebuild together, and
+    # ones forked late (recycled by max_requests) on their first request.
+    if _index is not None:
+        _index.rebuilding = False
+        _index.schedule()
+
+
+def listing_saved(kind, pk, title):
+    # Only an index this process has already loaded needs updating.
+    if _index is not None:
+        with _index.lock:
+            _index.update(kind, pk, title)
+
+
+def listing_deleted(kind, pk):
+    if _index is not None:
+        with _index.lock:
+            _index.remove(kind, pk)
+
+
+def reset():
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,147 @@
+# core/idempotency.py
+"""Idempotency-Key support for create endpoints.
+
+The first request with a given key claims it by inserting an in-progress
+IdempotencyKey row. Retries with the same key wait for that request to
+finish and then get its stored response back, without the view running
+again. Requests that fail with a 5xx or an exception release the key so
+the client can retry.
+"""
+import hashlib
+import json
+import time
+import zlib
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+# Left out of fingerprints, which are stored for IDEMPOTENCY_KEY_TTL
+CREDENTIAL_FIELDS = {'password'}
+
+
+def request_fingerprint(request):
+    """Keyed hash of the request payload.
+
+    Uploaded files count by name and size, and credentials not at all: an
+    unkeyed hash of a payload whose other fields are known would let anyone
+    who reads the table guess the password offline.
+    """
+    data = request.data
+    items = data.lists() if hasattr(data, 'lists') else data.items()
+    payload = {
+        key: [(value.name, value.size) if hasattr(value, 'read') else value for value in values]
+        if isinstance(values, list) else values
+        for key, values in items if key not in CREDENTIAL_FIELDS
+    }
+    return salted_hmac('core.idempotency', json.dumps(payload, sort_keys=True, default=str),
+                       algorithm='sha256').hexdigest()
+
+
+def scope_for(request, key, fingerprint):
+    if request.user.is_authenticated:
+        caller = request.user.pk
+    else:
+        # Anonymous callers have no identity to share a key under, so each
+        # payload gets its own scope: a stored response only ever goes back
+        # to a request that sent exactly the same thing.
+        caller = f'anonymous:{fingerprint}'
+    return hashlib.sha256(f'{caller}|{request.path}|{key}'.encode()).hexdigest()
+
+
+def claim(scope, fingerprint):
+    """Insert the in-progress row; return None if we got it, else the existing row."""
+    expires_at = timezone.now() + settings.IDEMPOTENCY_KEY_TTL
+    while True:
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(scope=scope, fingerprint=fingerprint, expires_at=expires_at)
+            return None
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(scope=scope).first()
+            if existing is None:
+                continue  # Released between our insert and the lookup
+            if existing.expires_at <= timezone.now():
+                IdempotencyKey.objects.filter(scope=scope, expires_at__lte=timezone.now()).delete()
+                continue
+            return existing
+
+
+def wait_for(scope):
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        existing = IdempotencyKey.objects.filter(scope=scope).first()
+        if existing is None or existing.status == IdempotencyKey.STATUS_DONE:
+            return existing
+    return IdempotencyKey.objects.filter(scope=scope).first()
+
+
+def replay(stored):
+    response = HttpResponse(
+        zlib.decompress(stored.response_body),
+        status=stored.response_status,
+        content_type=stored.response_content_type,
+    )
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(method):
+    """Make an APIView ``post`` method honour the Idempotency-Key header."""
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key:
+            return method(view, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': 'Idempotency-Key must be at most 255 characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        scope = scope_for(request, key, fingerprint)
+        existing = claim(scope, fingerprint)
+        if existing is not None:
+            if existing.fingerprint != fingerprint:
+                return Response({'error': 'Idempotency-Key was already used with a different request'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if existing.status != IdempotencyKey.STATUS_DONE:
+                existing = wait_for(scope)
+            if existing is None:
+                # The original request failed and released the key.
+                return wrapper(view, request, *args, **kwargs)
+            if existing.status != IdempotencyKey.STATUS_DONE:
+                return Response({'error': 'A request with this Idempotency-Key is still in progress'},
+                                status=status.HTTP_409_CONFLICT)
+            return replay(existing)
+
+        try:
+            response = method(view, request, *args, **kwargs)
+        except Exception:
+            IdempotencyKey.objects.filter(scope=scope).delete()
+            raise
+        if response.status_code >= 500:
+            IdempotencyKey.objects.filter(scope=scope).delete()
+            return response
+
+        if isinstance(response, Response):
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = view.get_renderer_context()
+            response.render()
+        IdempotencyKey.objects.filter(scope=scope).update(
+            status=IdempotencyKey.STATUS_DONE,
+            response_status=response.status_code,
+            response_content_type=response['Content-Type'],
+            response_body=zlib.compress(response.content),
+        )
+        return response
+    return wrapper
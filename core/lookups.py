@@ -0,0 +1,21 @@
+# core/lookups.py
+import re
+
+from django.db.models import CharField
+from django.db.models.lookups import StartsWith
+
+
+@CharField.register_lookup
+class Prefix(StartsWith):
+    """Case-sensitive prefix match that a plain btree index can serve.
+
+    On PostgreSQL this is ``startswith`` (LIKE, which Django's ``_like``
+    index covers). SQLite's LIKE ignores case and so never uses an ordinary
+    index, but GLOB does, so there the pattern is a GLOB instead.
+    """
+    lookup_name = 'prefix'
+
+    def as_sqlite(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        pattern = re.sub(r'([*?\[])', r'[\1]', self.rhs) + '*'
+        return f'{lhs} GLOB %s', (*params, pattern)
@@ -0,0 +1,20 @@
+# core/management/commands/archive_listings.py
+from django.core.management.base import BaseCommand
+from core.models import ArchivedListing
+
+class Command(BaseCommand):
+    help = 'Move sold, out-of-stock and old listings into the archive table (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        for kind in ArchivedListing.KINDS:
+            stale = ArchivedListing.stale(kind)
+            if options['dry_run']:
+                self.stdout.write(f'{kind}: {stale.count()} would be archived')
+            else:
+                moved = ArchivedListing.archive(stale, options['batch_size'])
+                self.stdout.write(f'{kind}: archived {moved}')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,53 @@
+# core/management/commands/benchmark_serializers.py
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from core.models import User, Category, Product
+from core.renderers import ORJSONRenderer
+from core.serializers import ProductSerializer, product_rows
+
+class Command(BaseCommand):
+    help = 'Compare rows/second of the ModelSerializer and values()-backed list paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Number of products to serialize')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per path; the best run is reported')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        # Everything is created inside a transaction that is rolled back.
+        with transaction.atomic():
+            user = User.objects.create_user(username='benchmark-seller', email='bench@example.com')
+            category = Category.objects.create(name='nafaka')
+            Product.objects.bulk_create([
+                Product(user=user, category=category, name=f'Mahindi {n}', description='Gunia la kilo 100',
+                        price=Decimal('85000.00'), quantity=n % 50, image=f'products/{n}.jpg')
+                for n in range(rows)
+            ])
+            queryset = Product.objects.filter(user=user)
+
+            def before():
+                data = ProductSerializer(queryset.select_related('user', 'category'), many=True).data
+                return JSONRenderer().render(data)
+
+            def after():
+                return ORJSONRenderer().render(product_rows.serialize(queryset))
+
+            results = {}
+            for label, run in (('ModelSerializer + JSONRenderer', before), ('RowSerializer + ORJSONRenderer', after)):
+                best = min(self.time(run) for _ in range(repeat))
+                results[label] = rows / best
+                self.stdout.write(f'{label:<32} {results[label]:>12,.0f} rows/s')
+            if before() != after():
+                self.stdout.write(self.style.ERROR('Output differs between the two paths'))
+            speedup = results['RowSerializer + ORJSONRenderer'] / results['ModelSerializer + JSONRenderer']
+            self.stdout.write(self.style.SUCCESS(f'Speedup: {speedup:.1f}x'))
+            transaction.set_rollback(True)
+
+    def time(self, run):
+        start = time.perf_counter()
+        run()
+        return time.perf_counter() - start
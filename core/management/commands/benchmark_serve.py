@@ -0,0 +1,111 @@
+# core/management/commands/benchmark_serve.py
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from kilimopesa.gunicorn_config import PROFILES, tune
+
+class Command(BaseCommand):
+    help = 'Load-test each gunicorn profile from `serve` and compare throughput, latency and memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/categories/', help='Endpoint to request')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load per profile')
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=['sync', 'gthread'])
+
+    def handle(self, *args, **options):
+        gunicorn = shutil.which('gunicorn')
+        if gunicorn is None:
+            raise CommandError('gunicorn is not installed')
+
+        self.stdout.write(f"{'profile':<9} {'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'PSS MB':>8}")
+        for profile in options['profiles']:
+            port = self.free_port()
+            env = dict(os.environ, WEB_PROFILE=profile, WEB_BIND=f'127.0.0.1:{port}', WEB_ACCESS_LOG='')
+            server = subprocess.Popen(
+                [gunicorn, '--config', 'python:kilimopesa.gunicorn_config'],
+                cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                url = f'http://127.0.0.1:{port}{options["path"]}'
+                self.wait_until_up(url)
+                latencies, errors = self.load(url, options['concurrency'], options['duration'])
+                pss = self.pss_mb(server.pid)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+            rate = len(latencies) / options['duration']
+            p50 = statistics.median(latencies) * 1000 if latencies else 0
+            p99 = statistics.quantiles(latencies, n=100)[98] * 1000 if len(latencies) > 1 else p50
+            workers = tune(profile)['workers']
+            self.stdout.write(
+                f"{profile:<9} {workers:>7} {rate:>9.1f} {p50:>8.1f} {p99:>8.1f} {errors:>7} "
+                f"{pss if pss is not None else float('nan'):>8.1f}"
+            )
+
+    def free_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def wait_until_up(self, url, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(url, timeout=2).read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'Server did not come up at {url}')
+
+    def load(self, url, concurrency, duration):
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client():
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    urllib.request.urlopen(url, timeout=10).read()
+                except OSError:
+                    with lock:
+                        errors[0] += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors[0]
+
+    def pss_mb(self, master_pid):
+        """Proportional set size of the master and its workers (Linux only)."""
+        if not sys.platform.startswith('linux'):
+            return None
+        pids = [master_pid]
+        try:
+            with open(f'/proc/{master_pid}/task/{master_pid}/children') as children:
+                pids += [int(pid) for pid in children.read().split()]
+            total_kb = 0
+            for pid in pids:
+                with open(f'/proc/{pid}/smaps_rollup') as smaps:
+                    for line in smaps:
+                        if line.startswith('Pss:'):
+                            total_kb += int(line.split()[1])
+        except OSError:
+            return None
+        return total_kb / 1024
@@ -0,0 +1,10 @@
+# core/management/commands/expire_reservations.py
+from django.core.management.base import BaseCommand
+from core.models import Order
+
+class Command(BaseCommand):
+    help = 'Release stock held by reservations that have passed their expiry time (run from cron)'
+
+    def handle(self, *args, **options):
+        expired = Order.expire_reservations()
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} reservation(s)'))
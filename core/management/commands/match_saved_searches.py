@@ -0,0 +1,13 @@
+# core/management/commands/match_saved_searches.py
+from django.core.management.base import BaseCommand
+from core.models import SearchAlert
+
+class Command(BaseCommand):
+    help = 'Queue alerts for listings created since the last run that match saved searches (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='New listings matched per transaction')
+
+    def handle(self, *args, **options):
+        queued = SearchAlert.match_new_listings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} alert(s)'))
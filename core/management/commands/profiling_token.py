@@ -0,0 +1,20 @@
+# core/management/commands/profiling_token.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.models import User
+from core.profiling import make_token
+
+class Command(BaseCommand):
+    help = 'Print an X-Profile header value that lets a staff user profile their own requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username'], is_staff=True, is_active=True).first()
+        if user is None:
+            raise CommandError(f"No active staff user named {options['username']}")
+        self.stdout.write(f'X-Profile: {make_token(user)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Valid for {settings.PROFILING_TOKEN_MAX_AGE // 60} minutes; reports appear under Profile reports in the admin'
+        ))
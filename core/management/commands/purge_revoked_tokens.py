@@ -0,0 +1,11 @@
+# core/management/commands/purge_revoked_tokens.py
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import RevokedToken
+
+class Command(BaseCommand):
+    help = 'Delete revoked refresh token ids whose tokens have expired anyway (run from cron)'
+
+    def handle(self, *args, **options):
+        deleted, _ = RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired revoked token(s)'))
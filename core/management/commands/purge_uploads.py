@@ -0,0 +1,10 @@
+# core/management/commands/purge_uploads.py
+from django.core.management.base import BaseCommand
+from core.models import ChunkedUpload
+
+class Command(BaseCommand):
+    help = 'Delete resumable uploads left idle past UPLOAD_SESSION_TTL, with their partial files (run from cron)'
+
+    def handle(self, *args, **options):
+        deleted = ChunkedUpload.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} abandoned upload(s)'))
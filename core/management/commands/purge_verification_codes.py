@@ -0,0 +1,11 @@
+# core/management/commands/purge_verification_codes.py
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import EmailVerificationCode
+
+class Command(BaseCommand):
+    help = 'Delete expired email verification codes (run from cron)'
+
+    def handle(self, *args, **options):
+        deleted, _ = EmailVerificationCode.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired verification code(s)'))
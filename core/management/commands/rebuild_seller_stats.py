@@ -0,0 +1,14 @@
+# core/management/commands/rebuild_seller_stats.py
+from django.core.management.base import BaseCommand
+from core.models import SellerStats
+
+class Command(BaseCommand):
+    help = 'Recompute dashboard counters for every seller (e.g. after bulk imports that bypass signals)'
+
+    def handle(self, *args, **options):
+        user_ids = set()
+        for model, _ in SellerStats.KINDS.values():
+            user_ids.update(model.objects.values_list('user_id', flat=True).distinct())
+        for user_id in user_ids:
+            SellerStats.refresh(user_id)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {len(user_ids)} seller(s)'))
@@ -0,0 +1,19 @@
+# core/management/commands/rebuild_similarity_index.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core import similarity
+
+class Command(BaseCommand):
+    help = 'Rebuild the similar-listings index and write it to SIMILARITY_INDEX_DIR for workers to memory-map'
+
+    def handle(self, *args, **options):
+        directory = settings.SIMILARITY_INDEX_DIR
+        for model in similarity.SPECS:
+            index = similarity.SimilarityIndex(model).build()
+            if directory:
+                index.save(directory)
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {index.size} listing(s)')
+        if directory:
+            self.stdout.write(self.style.SUCCESS(f'Wrote similarity index to {directory}'))
+        else:
+            self.stdout.write(self.style.WARNING('SIMILARITY_INDEX_DIR is not set; nothing was written'))
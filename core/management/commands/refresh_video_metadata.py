@@ -0,0 +1,17 @@
+# core/management/commands/refresh_video_metadata.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from core.youtube import refresh_metadata
+
+class Command(BaseCommand):
+    help = 'Refresh stored YouTube thumbnails, durations and view counts in batches of 50 ids (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=float, help='Refetch metadata older than this (default: YOUTUBE_METADATA_MAX_AGE)')
+        parser.add_argument('--all', action='store_true', help='Refetch every video regardless of age')
+
+    def handle(self, *args, **options):
+        max_age = timedelta(hours=options['max_age_hours']) if options['max_age_hours'] is not None else None
+        updated = refresh_metadata(max_age=max_age, force=options['all'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed metadata for {updated} video(s)'))
@@ -0,0 +1,18 @@
+# core/management/commands/response_cache_stats.py
+from django.core.management.base import BaseCommand
+from core import response_cache
+
+class Command(BaseCommand):
+    help = 'Show the (sampled) hit/miss counters of the shared listing response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        counts = response_cache.stats()
+        total = counts['hit'] + counts['miss']
+        ratio = counts['hit'] / total if total else 0
+        self.stdout.write(f"Hits: {counts['hit']}  Misses: {counts['miss']}  Hit ratio: {ratio:.1%}")
+        if options['reset']:
+            response_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
@@ -0,0 +1,18 @@
+# core/management/commands/restore_listing.py
+from django.core.management.base import BaseCommand, CommandError
+from core.models import ArchivedListing
+
+class Command(BaseCommand):
+    help = 'Move an archived listing back into its live table, keeping its id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(ArchivedListing.KINDS))
+        parser.add_argument('listing_id', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            archived = ArchivedListing.objects.get(kind=options['kind'], listing_id=options['listing_id'])
+        except ArchivedListing.DoesNotExist:
+            raise CommandError(f"No archived {options['kind']} with id {options['listing_id']}")
+        listing = archived.restore()
+        self.stdout.write(self.style.SUCCESS(f'Restored {listing}'))
@@ -0,0 +1,19 @@
+# core/management/commands/rollup_price_history.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import PriceRollup
+
+class Command(BaseCommand):
+    help = 'Roll recent price changes up into daily and weekly buckets for the price-history charts (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2,
+                            help='Recompute buckets with changes in the last N days (default 2)')
+        parser.add_argument('--all', action='store_true', help='Recompute every bucket from the full history')
+
+    def handle(self, *args, **options):
+        since = None if options['all'] else timezone.now() - timedelta(days=options['days'])
+        written = PriceRollup.rollup(since)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} price bucket(s)'))
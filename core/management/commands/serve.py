@@ -0,0 +1,39 @@
+# core/management/commands/serve.py
+import os
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+from kilimopesa.gunicorn_config import PROFILES, tune
+
+class Command(BaseCommand):
+    help = 'Run the production server under gunicorn with workers tuned for the machine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=PROFILES, default=os.environ.get('WEB_PROFILE', 'gthread'),
+                            help='Worker model (default: WEB_PROFILE or gthread)')
+        parser.add_argument('--bind', help='Address to listen on (default: 0.0.0.0:$PORT)')
+        parser.add_argument('--print-config', action='store_true', help='Show the tuned settings and exit')
+
+    def handle(self, *args, **options):
+        profile = options['profile']
+        config = tune(profile)
+        if options['print_config']:
+            for name, value in config.items():
+                self.stdout.write(f'{name} = {value!r}')
+            return
+
+        if profile == 'asgi':
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError('The asgi profile needs uvicorn installed')
+        gunicorn = shutil.which('gunicorn')
+        if gunicorn is None:
+            raise CommandError('gunicorn is not installed')
+
+        os.environ['WEB_PROFILE'] = profile
+        argv = [gunicorn, '--config', 'python:kilimopesa.gunicorn_config']
+        if options['bind']:
+            argv += ['--bind', options['bind']]
+        self.stdout.write(f"Starting gunicorn ({profile}: {config['workers']} workers x {config['threads']} threads)")
+        os.execv(gunicorn, argv)
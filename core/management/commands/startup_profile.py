@@ -0,0 +1,25 @@
+# core/management/commands/startup_profile.py
+from django.core.management.base import BaseCommand
+from core.startup import measure_startup
+
+class Command(BaseCommand):
+    help = 'Report per-module import time and time until AppConfig.ready for a fresh worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='Number of slowest imports to list')
+
+    def handle(self, *args, **options):
+        report = measure_startup()
+        self.stdout.write(f"Apps ready after:      {report['ready_seconds'] * 1000:8.1f} ms")
+        self.stdout.write(f"django.setup() done:   {report['setup_seconds'] * 1000:8.1f} ms")
+        self.stdout.write(f"WSGI app + URLconf:    {report['total_seconds'] * 1000:8.1f} ms")
+        self.stdout.write(f"Modules loaded:        {report['module_count']:8d}")
+        self.stdout.write('')
+        self.stdout.write(f"{'self ms':>9} {'cumul ms':>9}  module")
+        slowest = sorted(report['imports'], key=lambda item: item[2], reverse=True)[:options['top']]
+        for name, self_us, cumulative_us in slowest:
+            self.stdout.write(f'{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name}')
+        if report['deferred_loaded']:
+            self.stdout.write(self.style.WARNING(
+                f"Loaded at startup but meant to be deferred: {', '.join(report['deferred_loaded'])}"
+            ))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_orders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seller_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('products_count', models.PositiveIntegerField(default=0)),
+                ('products_stock_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('products_last_activity', models.DateTimeField(blank=True, null=True)),
+                ('lands_count', models.PositiveIntegerField(default=0)),
+                ('lands_last_activity', models.DateTimeField(blank=True, null=True)),
+                ('inputs_count', models.PositiveIntegerField(default=0)),
+                ('inputs_stock_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('inputs_last_activity', models.DateTimeField(blank=True, null=True)),
+                ('services_count', models.PositiveIntegerField(default=0)),
+                ('services_last_activity', models.DateTimeField(blank=True, null=True)),
+                ('videos_count', models.PositiveIntegerField(default=0)),
+                ('videos_last_activity', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Seller stats',
+            },
+        ),
+    ]
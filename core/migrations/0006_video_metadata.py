@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_seller_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoMetadata',
+            fields=[
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metadata', serialize=False, to='core.video')),
+                ('available', models.BooleanField(default=True)),
+                ('thumbnail_url', models.URLField(blank=True, max_length=500)),
+                ('duration_seconds', models.PositiveIntegerField(blank=True, null=True)),
+                ('view_count', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('fetched_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Video metadata',
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_current_prices(apps, schema_editor):
+    # Start every existing listing's history at its current price.
+    PricePoint = apps.get_model('core', 'PricePoint')
+    db = schema_editor.connection.alias
+    for kind, model_name in ((1, 'Product'), (2, 'Land')):
+        model = apps.get_model('core', model_name)
+        PricePoint.objects.using(db).bulk_create(
+            (PricePoint(kind=kind, listing_id=pk, price=price, recorded_at=updated_at)
+             for pk, price, updated_at in model.objects.using(db).values_list('pk', 'price', 'updated_at').iterator()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricePoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Product'), (2, 'Land')])),
+                ('listing_id', models.PositiveBigIntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'listing_id', 'recorded_at'], name='pricepoint_listing_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Product'), (2, 'Land')])),
+                ('listing_id', models.PositiveBigIntegerField()),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4)),
+                ('bucket', models.DateField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('changes', models.PositiveIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'listing_id', 'period', 'bucket'), name='pricerollup_bucket_unique')],
+            },
+        ),
+        migrations.RunPython(seed_current_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_price_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('products', 'Products'), ('lands', 'Lands'), ('inputs', 'Inputs'), ('services', 'Services')], max_length=10)),
+                ('listing_id', models.PositiveBigIntegerField()),
+                ('data', models.JSONField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_listings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'listing_id'), name='archivedlisting_unique')],
+            },
+        ),
+    ]
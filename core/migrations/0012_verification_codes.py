@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+
+def hash_existing_codes(apps, schema_editor):
+    # Outstanding plain-text codes keep working, hashed, for one more TTL.
+    User = apps.get_model('core', 'User')
+    EmailVerificationCode = apps.get_model('core', 'EmailVerificationCode')
+    db = schema_editor.connection.alias
+    expires_at = timezone.now() + settings.VERIFICATION_CODE_TTL
+    pending = User.objects.using(db).filter(is_email_verified=False, verification_code__isnull=False).exclude(verification_code='')
+    EmailVerificationCode.objects.using(db).bulk_create(
+        (EmailVerificationCode(
+            user_id=pk,
+            code_hash=salted_hmac('core.EmailVerificationCode', f'{pk}:{code}', algorithm='sha256').hexdigest(),
+            expires_at=expires_at,
+        ) for pk, code in pending.values_list('pk', 'verification_code').iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_profile_reports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailVerificationCode',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='email_verification_code', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('code_hash', models.CharField(max_length=64)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(hash_existing_codes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='user',
+            name='verification_code',
+        ),
+    ]
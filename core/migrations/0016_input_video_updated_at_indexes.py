@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_listing_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='input',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -1,12 +1,22 @@
 # core/models.py
+import os
+import re
+import uuid
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core import serializers
 from django.db import models
 from django.contrib.auth.models import AbstractUser, Group, Permission
-from django.utils.crypto import get_random_string
+from django.utils.crypto import constant_time_compare, get_random_string, salted_hmac
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 
 class User(AbstractUser):
     is_email_verified = models.BooleanField(default=False)
-    verification_code = models.CharField(max_length=6, blank=True, null=True)
     
     groups = models.ManyToManyField(
         Group,
@@ -25,11 +35,6 @@ class User(AbstractUser):
         related_query_name="custom_user",
     )
     
-    def generate_verification_code(self):
-        self.verification_code = get_random_string(length=6, allowed_chars='0123456789')
-        self.save()
-        return self.verification_code
-
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
@@ -37,6 +42,66 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+class EmailVerificationCode(models.Model):
+    """The outstanding email verification code for a user.
+
+    Only an HMAC of the code is stored. A code expires after
+    VERIFICATION_CODE_TTL and stops working after
+    VERIFICATION_CODE_MAX_ATTEMPTS guesses; issuing a new one resets both.
+    """
+    OK = 'ok'
+    INVALID = 'invalid'
+    EXPIRED = 'expired'
+    LOCKED = 'locked'
+    MISSING = 'missing'
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='email_verification_code'
+    )
+    code_hash = models.CharField(max_length=64)
+    expires_at = models.DateTimeField(db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    @staticmethod
+    def hash_code(user_id, code):
+        return salted_hmac('core.EmailVerificationCode', f'{user_id}:{code}', algorithm='sha256').hexdigest()
+
+    @classmethod
+    def issue(cls, user):
+        """Store a fresh code for ``user`` and return it in plain text, for the email."""
+        code = get_random_string(length=6, allowed_chars='0123456789')
+        cls.objects.update_or_create(user_id=user.pk, defaults={
+            'code_hash': cls.hash_code(user.pk, code),
+            'expires_at': timezone.now() + settings.VERIFICATION_CODE_TTL,
+            'attempts': 0,
+        })
+        return code
+
+    @classmethod
+    def verify(cls, user, code):
+        """Return OK and use up the code if it matches, else why it didn't."""
+        now = timezone.now()
+        # Claim the attempt before looking at the code, so parallel guesses
+        # can't all get in under the limit.
+        claimed = cls.objects.filter(
+            user_id=user.pk, attempts__lt=settings.VERIFICATION_CODE_MAX_ATTEMPTS, expires_at__gt=now,
+        ).update(attempts=F('attempts') + 1)
+        stored = cls.objects.filter(user_id=user.pk).first()
+        if stored is None:
+            return cls.MISSING
+        if not claimed:
+            return cls.EXPIRED if stored.expires_at <= now else cls.LOCKED
+        if constant_time_compare(stored.code_hash, cls.hash_code(user.pk, code)):
+            # Deleting by hash makes a concurrent second use of the same code fail.
+            return cls.OK if cls.objects.filter(user_id=user.pk, code_hash=stored.code_hash).delete()[0] else cls.MISSING
+        return cls.INVALID
+
+    def __str__(self):
+        return f"Verification code for user {self.user_id}"
+
 class Category(models.Model):
     name = models.CharField(max_length=100, choices=[
         ('mazao_ya_biashara', 'Mazao ya Biashara'),
@@ -58,13 +123,15 @@ class Product(models.Model):
         on_delete=models.CASCADE,
         related_name='products'
     )
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField()
     image = models.ImageField(upload_to='products/', blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Bumped on every API edit; the ETag / If-Match value for optimistic concurrency
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return f"{self.name} - {self.user.username}"
@@ -75,15 +142,16 @@ class Land(models.Model):
         on_delete=models.CASCADE,
         related_name='lands'
     )
-    title = models.CharField(max_length=200)
+    title = models.CharField(max_length=200, db_index=True)
     description = models.TextField()
     size = models.DecimalField(max_digits=10, decimal_places=2)
-    location = models.CharField(max_length=200)
+    location = models.CharField(max_length=200, db_index=True)
     price = models.DecimalField(max_digits=12, decimal_places=2)
     is_for_sale = models.BooleanField(default=True)
     image = models.ImageField(upload_to='land/', blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return f"{self.title} - {self.location}"
@@ -94,13 +162,14 @@ class Input(models.Model):
         on_delete=models.CASCADE,
         related_name='inputs'
     )
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField()
     image = models.ImageField(upload_to='inputs/', blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return f"{self.name} ({self.quantity} available)"
@@ -111,13 +180,14 @@ class Service(models.Model):
         on_delete=models.CASCADE,
         related_name='services'
     )
-    title = models.CharField(max_length=200)
+    title = models.CharField(max_length=200, db_index=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
-    location = models.CharField(max_length=200)
+    location = models.CharField(max_length=200, db_index=True)
     image = models.ImageField(upload_to='services/', blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return f"{self.title} - {self.location}"
@@ -128,11 +198,824 @@ class Video(models.Model):
         on_delete=models.CASCADE,
         related_name='videos'
     )
-    title = models.CharField(max_length=200)
+    title = models.CharField(max_length=200, db_index=True)
     youtube_video_id = models.CharField(max_length=100)
     description = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    version = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.title} by {self.user.username}"
+
+class VideoMetadata(models.Model):
+    """YouTube details for a Video, refreshed by `refresh_video_metadata`.
+
+    Serializers only ever read this table, so listing videos never calls
+    out to YouTube.
+    """
+    video = models.OneToOneField(
+        Video,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='metadata'
+    )
+    available = models.BooleanField(default=True)
+    thumbnail_url = models.URLField(max_length=500, blank=True)
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True)
+    view_count = models.PositiveBigIntegerField(null=True, blank=True)
+    fetched_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'Video metadata'
+
+    def __str__(self):
+        return f"Metadata for video {self.video_id}"
+
+class OutOfStock(Exception):
+    def __init__(self, item_type, item_id):
+        self.item_type = item_type
+        self.item_id = item_id
+        super().__init__(f"Not enough stock for {item_type} {item_id}")
+
+class Order(models.Model):
+    """A checkout that holds stock until it is confirmed, cancelled or expires.
+
+    Stock is taken with conditional ``UPDATE ... SET quantity = quantity - n
+    WHERE quantity >= n`` statements, so concurrent buyers can never oversell
+    and only the rows being bought are locked.
+    """
+    STATUS_RESERVED = 'reserved'
+    STATUS_CONFIRMED = 'confirmed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_EXPIRED = 'expired'
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='orders'
+    )
+    status = models.CharField(max_length=20, default=STATUS_RESERVED, choices=[
+        (STATUS_RESERVED, 'Reserved'),
+        (STATUS_CONFIRMED, 'Confirmed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+        (STATUS_EXPIRED, 'Expired'),
+    ])
+    expires_at = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['status', 'expires_at'])]
+
+    @classmethod
+    def reserve(cls, user, lines):
+        """Create a reserved order from ``(item, quantity)`` pairs.
+
+        ``item`` is a Product or Input. Raises OutOfStock, and rolls the whole
+        order back, if any line cannot be filled.
+        """
+        wanted = {}
+        for item, quantity in lines:
+            key = (type(item), item.pk)
+            wanted[key] = wanted.get(key, 0) + quantity
+
+        expires_at = timezone.now() + settings.ORDER_RESERVATION_TTL
+        with transaction.atomic():
+            order = cls.objects.create(user=user, expires_at=expires_at)
+            # A fixed update order keeps concurrent multi-line orders from
+            # deadlocking on each other's rows.
+            for (model, pk), quantity in sorted(wanted.items(), key=lambda kv: (kv[0][0].__name__, kv[0][1])):
+                updated = model.objects.filter(pk=pk, quantity__gte=quantity).update(
+                    quantity=F('quantity') - quantity
+                )
+                if not updated:
+                    raise OutOfStock(model.__name__.lower(), pk)
+            # Stock changes made with update() skip the listing signals.
+            taken = {key: -quantity for key, quantity in wanted.items()}
+            transaction.on_commit(lambda: stock_changed(taken))
+            OrderLine.objects.bulk_create([
+                OrderLine(
+                    order=order,
+                    product=item if isinstance(item, Product) else None,
+                    input=item if isinstance(item, Input) else None,
+                    quantity=quantity,
+                    unit_price=item.price,
+                )
+                for item, quantity in lines
+            ])
+        return order
+
+    def confirm(self):
+        confirmed = Order.objects.filter(
+            pk=self.pk, status=self.STATUS_RESERVED, expires_at__gt=timezone.now()
+        ).update(status=self.STATUS_CONFIRMED, updated_at=timezone.now())
+        if confirmed:
+            self.status = self.STATUS_CONFIRMED
+        return bool(confirmed)
+
+    def release(self, status=STATUS_CANCELLED):
+        """Return reserved stock and move the order to ``status``."""
+        with transaction.atomic():
+            # Only the caller that flips the status gives the stock back.
+            if not Order.objects.filter(pk=self.pk, status=self.STATUS_RESERVED).update(
+                status=status, updated_at=timezone.now()
+            ):
+                return False
+            released = {}
+            for line in self.lines.order_by('product_id', 'input_id'):
+                model, pk = (Product, line.product_id) if line.product_id else (Input, line.input_id)
+                model.objects.filter(pk=pk).update(quantity=F('quantity') + line.quantity)
+                released[(model, pk)] = released.get((model, pk), 0) + line.quantity
+            transaction.on_commit(lambda: stock_changed(released))
+        self.status = status
+        return True
+
+    @classmethod
+    def expire_reservations(cls, now=None):
+        now = now or timezone.now()
+        expired = 0
+        for order in cls.objects.filter(status=cls.STATUS_RESERVED, expires_at__lte=now).iterator():
+            expired += order.release(cls.STATUS_EXPIRED)
+        return expired
+
+    def __str__(self):
+        return f"Order {self.pk} ({self.status})"
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, null=True, blank=True, related_name='order_lines')
+    input = models.ForeignKey(Input, on_delete=models.PROTECT, null=True, blank=True, related_name='order_lines')
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(product__isnull=False, input__isnull=True)
+                | models.Q(product__isnull=True, input__isnull=False),
+                name='orderline_one_item',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product or self.input}"
+
+class SellerStats(models.Model):
+    """Per-seller listing counters behind the dashboard endpoint.
+
+    Listing saves, deletes and orders add their difference to the counters
+    with a single ``F()`` UPDATE (see core.signals), so neither writes nor
+    reads of the dashboard depend on how many listings a seller has.
+    `refresh` recomputes a row from scratch; `rebuild_seller_stats` uses it
+    to repair counters after writes that bypass the signals.
+    """
+    # Listing type -> (model, has stock value)
+    KINDS = {
+        'products': (Product, True),
+        'lands': (Land, False),
+        'inputs': (Input, True),
+        'services': (Service, False),
+        'videos': (Video, False),
+    }
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='seller_stats'
+    )
+    products_count = models.PositiveIntegerField(default=0)
+    products_stock_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    products_last_activity = models.DateTimeField(null=True, blank=True)
+    lands_count = models.PositiveIntegerField(default=0)
+    lands_last_activity = models.DateTimeField(null=True, blank=True)
+    inputs_count = models.PositiveIntegerField(default=0)
+    inputs_stock_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    inputs_last_activity = models.DateTimeField(null=True, blank=True)
+    services_count = models.PositiveIntegerField(default=0)
+    services_last_activity = models.DateTimeField(null=True, blank=True)
+    videos_count = models.PositiveIntegerField(default=0)
+    videos_last_activity = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Seller stats'
+
+    @classmethod
+    def kind_for(cls, model):
+        for kind, (kind_model, _) in cls.KINDS.items():
+            if kind_model is model:
+                return kind
+        return None
+
+    @classmethod
+    def compute(cls, user_id, kinds=None):
+        values = {}
+        for kind in kinds or cls.KINDS:
+            model, has_stock = cls.KINDS[kind]
+            aggregates = {'count': Count('pk'), 'last_activity': Max('updated_at')}
+            if has_stock:
+                aggregates['stock_value'] = Sum(F('price') * F('quantity'))
+            result = model.objects.filter(user_id=user_id).aggregate(**aggregates)
+            for name, value in result.items():
+                if name == 'stock_value' and value is None:
+                    value = 0
+                values[f'{kind}_{name}'] = value
+        return values
+
+    @classmethod
+    def refresh(cls, user_id, kinds=None):
+        with transaction.atomic():
+            # Lock the row before counting so a concurrent refresh can't
+            # overwrite our numbers with older ones.
+            list(cls.objects.select_for_update().filter(pk=user_id))
+            stats, _ = cls.objects.update_or_create(user_id=user_id, defaults=cls.compute(user_id, kinds))
+        return stats
+
+    @classmethod
+    def contribution(cls, listing):
+        """``(seller id, stock value)`` that ``listing`` adds to the counters.
+
+        Only values already loaded on the instance are used; None means
+        some were deferred.
+        """
+        values = listing.__dict__
+        if 'user_id' not in values:
+            return None
+        if not cls.KINDS[cls.kind_for(type(listing))][1]:
+            return values['user_id'], 0
+        if values.get('price') is None or values.get('quantity') is None:
+            return None
+        return values['user_id'], Decimal(values['price']) * int(values['quantity'])
+
+    @classmethod
+    def add(cls, user_id, kind, count=0, stock_value=0, activity=None):
+        """Apply a change to one seller's ``kind`` counters in a single UPDATE."""
+        changes = {}
+        if count:
+            changes[f'{kind}_count'] = F(f'{kind}_count') + count
+        if stock_value and cls.KINDS[kind][1]:
+            changes[f'{kind}_stock_value'] = F(f'{kind}_stock_value') + stock_value
+        if activity is not None:
+            field, when = f'{kind}_last_activity', Value(activity, output_field=models.DateTimeField())
+            changes[field] = Greatest(Coalesce(F(field), when), when)
+        if changes and not cls.objects.filter(pk=user_id).update(**changes):
+            # No row yet: count everything, this change included.
+            cls.refresh(user_id)
+
+    @classmethod
+    def apply_stock_changes(cls, changes):
+        """Apply ``{(model, pk): quantity change}`` made with ``update()``."""
+        totals = {}
+        for model in {model for model, _ in changes}:
+            pks = [pk for changed_model, pk in changes if changed_model is model]
+            for pk, user_id, price in model.objects.filter(pk__in=pks).values_list('pk', 'user_id', 'price'):
+                key = (user_id, cls.kind_for(model))
+                totals[key] = totals.get(key, 0) + price * changes[(model, pk)]
+        for (user_id, kind), stock_value in totals.items():
+            cls.add(user_id, kind, stock_value=stock_value)
+
+    def __str__(self):
+        return f"Stats for user {self.user_id}"
+
+def stock_changed(changes):
+    """Bring derived data up to date after stock ``update()`` calls.
+
+    ``changes`` maps ``(model, pk)`` to the change in quantity.
+    """
+    from . import response_cache
+    SellerStats.apply_stock_changes(changes)
+    for model, pk in changes:
+        response_cache.invalidate(model, pk)
+
+class PricePoint(models.Model):
+    """One price a listing had from ``recorded_at`` on. Rows are only ever appended.
+
+    The table is kept narrow (no foreign keys, a small integer for the
+    listing type) because it grows with every price change; charts read
+    the PriceRollup buckets built from it instead.
+    """
+    KIND_PRODUCT = 1
+    KIND_LAND = 2
+    MODELS = {KIND_PRODUCT: Product, KIND_LAND: Land}
+
+    kind = models.PositiveSmallIntegerField(choices=[(KIND_PRODUCT, 'Product'), (KIND_LAND, 'Land')])
+    listing_id = models.PositiveBigIntegerField()
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'listing_id', 'recorded_at'], name='pricepoint_listing_idx')]
+
+    @classmethod
+    def kind_for(cls, model):
+        for kind, kind_model in cls.MODELS.items():
+            if kind_model is model:
+                return kind
+        return None
+
+    @classmethod
+    def record(cls, instance, check_last=True):
+        """Append the listing's price if it differs from the last one recorded.
+
+        Callers that already know the price changed pass ``check_last=False``
+        to skip the lookup.
+        """
+        kind = cls.kind_for(type(instance))
+        if check_last:
+            last = (cls.objects.filter(kind=kind, listing_id=instance.pk)
+                    .order_by('-recorded_at', '-pk').values_list('price', flat=True).first())
+            if last is not None and last == instance.price:
+                return None
+        return cls.objects.create(kind=kind, listing_id=instance.pk, price=instance.price)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.listing_id}: {self.price} at {self.recorded_at:%Y-%m-%d %H:%M}"
+
+class PriceRollup(models.Model):
+    """Open/high/low/close of a listing's price per day or week.
+
+    Only buckets in which the price changed have a row; the price carries
+    over unchanged between them. Built by `rollup_price_history`.
+    """
+    PERIOD_DAY = 'day'
+    PERIOD_WEEK = 'week'
+
+    kind = models.PositiveSmallIntegerField(choices=[(PricePoint.KIND_PRODUCT, 'Product'), (PricePoint.KIND_LAND, 'Land')])
+    listing_id = models.PositiveBigIntegerField()
+    period = models.CharField(max_length=4, choices=[(PERIOD_DAY, 'Day'), (PERIOD_WEEK, 'Week')])
+    bucket = models.DateField()
+    open = models.DecimalField(max_digits=12, decimal_places=2)
+    high = models.DecimalField(max_digits=12, decimal_places=2)
+    low = models.DecimalField(max_digits=12, decimal_places=2)
+    close = models.DecimalField(max_digits=12, decimal_places=2)
+    changes = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'listing_id', 'period', 'bucket'], name='pricerollup_bucket_unique'),
+        ]
+
+    @staticmethod
+    def bucket_for(period, moment):
+        day = timezone.localdate(moment) if isinstance(moment, datetime) else moment
+        return day if period == PriceRollup.PERIOD_DAY else day - timedelta(days=day.weekday())
+
+    @classmethod
+    def rollup(cls, since=None):
+        """Recompute every bucket holding a price point recorded at or after ``since``.
+
+        Returns the number of buckets written.
+        """
+        points = PricePoint.objects.order_by('recorded_at', 'pk')
+        if since is not None:
+            # Start at the week boundary so weekly buckets are recomputed whole.
+            start = cls.bucket_for(cls.PERIOD_WEEK, since)
+            points = points.filter(recorded_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+        buckets = {}
+        for kind, listing_id, price, recorded_at in points.values_list('kind', 'listing_id', 'price', 'recorded_at').iterator():
+            for period in (cls.PERIOD_DAY, cls.PERIOD_WEEK):
+                key = (kind, listing_id, period, cls.bucket_for(period, recorded_at))
+                values = buckets.get(key)
+                if values is None:
+                    buckets[key] = [price, price, price, price, 1]
+                else:
+                    values[1] = max(values[1], price)
+                    values[2] = min(values[2], price)
+                    values[3] = price
+                    values[4] += 1
+        cls.objects.bulk_create(
+            [
+                cls(kind=kind, listing_id=listing_id, period=period, bucket=bucket,
+                    open=open_, high=high, low=low, close=close, changes=changes)
+                for (kind, listing_id, period, bucket), (open_, high, low, close, changes) in buckets.items()
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['kind', 'listing_id', 'period', 'bucket'],
+            update_fields=['open', 'high', 'low', 'close', 'changes'],
+        )
+        return len(buckets)
+
+    @classmethod
+    def series(cls, kind, listing_id, start, end, max_points):
+        """Chart buckets for ``start``..``end`` (dates), at most ``max_points`` of them.
+
+        Daily buckets are used when the range fits, weekly ones otherwise,
+        with runs of weeks merged when even those would be too many.
+        Returns ``(period, price_before_start, buckets)``.
+        """
+        days = (end - start).days + 1
+        period = cls.PERIOD_DAY if days <= max_points else cls.PERIOD_WEEK
+        first = cls.bucket_for(period, start)
+        rows = cls.objects.filter(kind=kind, listing_id=listing_id, period=period)
+        before = rows.filter(bucket__lt=first).order_by('-bucket').values_list('close', flat=True).first()
+        fields = ['bucket', 'open', 'high', 'low', 'close', 'changes']
+        buckets = [dict(zip(fields, row)) for row in
+                   rows.filter(bucket__gte=first, bucket__lte=end).order_by('bucket').values_list(*fields)]
+        # Count whole buckets from the aligned start: a range that doesn't
+        # begin on a Monday touches one more week than its length suggests.
+        weeks_per_point = -(-((end - first).days // 7 + 1) // max_points)
+        if period == cls.PERIOD_WEEK and weeks_per_point > 1:
+            merged = []
+            for row in buckets:
+                group = first + timedelta(weeks=(row['bucket'] - first).days // 7 // weeks_per_point * weeks_per_point)
+                if merged and merged[-1]['bucket'] == group:
+                    last = merged[-1]
+                    last['high'] = max(last['high'], row['high'])
+                    last['low'] = min(last['low'], row['low'])
+                    last['close'] = row['close']
+                    last['changes'] += row['changes']
+                else:
+                    merged.append(dict(row, bucket=group))
+            buckets = merged
+        return period, before, buckets
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.listing_id} {self.period} {self.bucket}"
+
+class ArchivedListing(models.Model):
+    """A listing moved out of its hot table by `archive_listings`.
+
+    ``data`` holds the row in the layout of Django's ``python`` serializer,
+    so `restore` puts it back with its original id and timestamps.
+    """
+    # Listing type -> model, for the types archival applies to
+    KINDS = {kind: SellerStats.KINDS[kind][0] for kind in ('products', 'lands', 'inputs', 'services')}
+
+    kind = models.CharField(max_length=10, choices=[(kind, kind.title()) for kind in KINDS])
+    listing_id = models.PositiveBigIntegerField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_listings'
+    )
+    data = models.JSONField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'listing_id'], name='archivedlisting_unique'),
+        ]
+
+    @classmethod
+    def kind_for(cls, model):
+        for kind, kind_model in cls.KINDS.items():
+            if kind_model is model:
+                return kind
+        return None
+
+    @classmethod
+    def archive(cls, queryset, batch_size=500):
+        """Move the rows of ``queryset`` into the archive, one transaction per batch.
+
+        The queryset is re-evaluated for every batch, so rows that stopped
+        matching it in the meantime stay where they are. Returns the number
+        of rows moved.
+        """
+        model = queryset.model
+        kind = cls.kind_for(model)
+        moved = 0
+        while True:
+            with transaction.atomic():
+                rows = list(queryset.select_for_update().order_by('pk')[:batch_size])
+                if not rows:
+                    return moved
+                cls.objects.bulk_create([
+                    cls(kind=kind, listing_id=row.pk, user_id=row.user_id, data=cls.dump(row)) for row in rows
+                ])
+                model.objects.filter(pk__in=[row.pk for row in rows]).delete()
+            moved += len(rows)
+
+    @staticmethod
+    def dump(row):
+        # The python serializer's layout, but with every value as its exact
+        # string form (DjangoJSONEncoder would round datetimes to milliseconds).
+        fields = {}
+        for field in row._meta.concrete_fields:
+            if not field.primary_key:
+                fields[field.name] = None if field.value_from_object(row) is None else field.value_to_string(row)
+        return {'model': row._meta.label_lower, 'pk': row.pk, 'fields': fields}
+
+    @classmethod
+    def stale(cls, kind, now=None):
+        """Listings of ``kind`` that the archive policy says should be moved.
+
+        Rows are eligible once they have been untouched for
+        ``ARCHIVE_AFTER_DAYS[kind]`` days and are sold (land), out of stock
+        (products and inputs) or simply old (services). Products and inputs
+        that appear on an order stay put, since order lines protect them.
+        """
+        model = cls.KINDS[kind]
+        cutoff = (now or timezone.now()) - timedelta(days=settings.ARCHIVE_AFTER_DAYS[kind])
+        queryset = model.objects.filter(updated_at__lt=cutoff)
+        if kind == 'lands':
+            queryset = queryset.filter(is_for_sale=False)
+        elif kind in ('products', 'inputs'):
+            ordered = OrderLine.objects.filter(**{model._meta.model_name: OuterRef('pk')})
+            queryset = queryset.filter(quantity=0).exclude(Exists(ordered))
+        return queryset
+
+    def as_instance(self):
+        """The archived row as an unsaved model instance, for serializers."""
+        return next(serializers.deserialize('python', [self.data])).object
+
+    @transaction.atomic
+    def restore(self):
+        instance = next(serializers.deserialize('python', [self.data]))
+        # Saved raw, like loaddata, so auto_now fields keep their values.
+        instance.save()
+        self.delete()
+        return instance.object
+
+    def __str__(self):
+        return f"Archived {self.kind} {self.listing_id}"
+
+class SavedSearch(models.Model):
+    """A buyer's standing query; new listings that match it raise a SearchAlert.
+
+    Each search is filed under one ``anchor`` term it requires of every
+    match: its longest keyword, else its category, else its location, else
+    ``*``. Matching a new listing only has to look up the searches anchored
+    on one of the listing's own terms (an indexed ``IN`` query) and check
+    those few in full, instead of trying every search.
+    """
+    # Listing type -> model; only types buyers search for by these fields
+    KINDS = {'products': Product, 'lands': Land}
+    # values() columns each kind is matched on
+    FIELDS = {
+        'products': {'title': 'name', 'category': 'category_id', 'location': None},
+        'lands': {'title': 'title', 'category': None, 'location': 'location'},
+    }
+    TOKEN_RE = re.compile(r'\w\w+')
+    MAX_PER_USER = 20
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='saved_searches'
+    )
+    kind = models.CharField(max_length=10, choices=[(kind, kind.title()) for kind in KINDS])
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    min_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    location = models.CharField(max_length=200, blank=True)
+    keywords = models.CharField(max_length=200, blank=True)
+    anchor = models.CharField(max_length=110, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'anchor'], name='savedsearch_anchor_idx')]
+        verbose_name_plural = 'Saved searches'
+
+    @classmethod
+    def tokens(cls, text):
+        return set(cls.TOKEN_RE.findall((text or '').lower()))
+
+    @classmethod
+    def listing_terms(cls, kind, row):
+        """Every anchor a search matching ``row`` (a values() dict) could have."""
+        fields = cls.FIELDS[kind]
+        terms = {'*'}
+        terms.update(f'kw:{token}' for token in cls.tokens(f"{row[fields['title']]} {row['description']}"))
+        if fields['category']:
+            terms.add(f"cat:{row[fields['category']]}")
+        if fields['location']:
+            terms.update(f'loc:{token}' for token in cls.tokens(row[fields['location']]))
+        return terms
+
+    def compute_anchor(self):
+        keywords = self.tokens(self.keywords)
+        if keywords:
+            return f"kw:{max(sorted(keywords), key=len)}"
+        if self.category_id:
+            return f'cat:{self.category_id}'
+        places = self.tokens(self.location)
+        if places:
+            return f"loc:{max(sorted(places), key=len)}"
+        return '*'
+
+    def save(self, *args, **kwargs):
+        self.anchor = self.compute_anchor()
+        super().save(*args, **kwargs)
+
+    def matches(self, row):
+        fields = self.FIELDS[self.kind]
+        if self.category_id and self.category_id != row[fields['category']]:
+            return False
+        if self.min_price is not None and (row['price'] is None or row['price'] < self.min_price):
+            return False
+        if self.max_price is not None and (row['price'] is None or row['price'] > self.max_price):
+            return False
+        if self.location and not self.tokens(self.location) <= self.tokens(row[fields['location']]):
+            return False
+        if self.keywords and not self.tokens(self.keywords) <= self.tokens(f"{row[fields['title']]} {row['description']}"):
+            return False
+        return True
+
+    def __str__(self):
+        return f"{self.kind} search by user {self.user_id}"
+
+class AlertCheckpoint(models.Model):
+    """The newest listing id of each kind `match_saved_searches` has seen."""
+    kind = models.CharField(max_length=10, primary_key=True)
+    last_listing_id = models.PositiveBigIntegerField()
+
+class SearchAlert(models.Model):
+    """A queued notification that a new listing matched a saved search."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='search_alerts'
+    )
+    saved_search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='alerts')
+    kind = models.CharField(max_length=10)
+    listing_id = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    seen_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['saved_search', 'kind', 'listing_id'], name='searchalert_unique'),
+        ]
+        indexes = [models.Index(fields=['user', 'seen_at'], name='searchalert_user_idx')]
+
+    @classmethod
+    def match_new_listings(cls, batch_size=500, lag=timedelta(seconds=5)):
+        """Queue alerts for listings created since the last run; return how many.
+
+        Listings newer than ``lag`` wait for the next run, so one whose
+        transaction commits after a later id was checkpointed isn't skipped.
+        """
+        queued = 0
+        cutoff = timezone.now() - lag
+        for kind, model in SavedSearch.KINDS.items():
+            checkpoint = AlertCheckpoint.objects.filter(kind=kind).first()
+            if checkpoint is None:
+                # The first run starts from now rather than alerting on history.
+                last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+                checkpoint = AlertCheckpoint.objects.create(kind=kind, last_listing_id=last)
+            fields = ['pk', 'user_id', 'description', 'price', *filter(None, SavedSearch.FIELDS[kind].values())]
+            while True:
+                rows = list(
+                    model.objects.filter(pk__gt=checkpoint.last_listing_id, created_at__lt=cutoff)
+                    .order_by('pk').values(*fields)[:batch_size]
+                )
+                if not rows:
+                    break
+                terms = {row['pk']: SavedSearch.listing_terms(kind, row) for row in rows}
+                by_anchor = {}
+                for search in SavedSearch.objects.filter(kind=kind, anchor__in=set().union(*terms.values())):
+                    by_anchor.setdefault(search.anchor, []).append(search)
+                alerts = [
+                    cls(user_id=search.user_id, saved_search=search, kind=kind, listing_id=row['pk'])
+                    for row in rows
+                    for term in terms[row['pk']]
+                    for search in by_anchor.get(term, ())
+                    if search.user_id != row['user_id'] and search.matches(row)
+                ]
+                with transaction.atomic():
+                    cls.objects.bulk_create(alerts, ignore_conflicts=True)
+                    checkpoint.last_listing_id = rows[-1]['pk']
+                    checkpoint.save(update_fields=['last_listing_id'])
+                queued += len(alerts)
+                if len(rows) < batch_size:
+                    break
+        return queued
+
+    def __str__(self):
+        return f"Alert for user {self.user_id}: {self.kind} {self.listing_id}"
+
+class ProfileReport(models.Model):
+    """cProfile output and SQL timings for one request profiled by a staff user.
+
+    Written by core.profiling.ProfilingMiddleware and read in the admin.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='profile_reports'
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    sql_ms = models.FloatField()
+    profile = models.TextField()
+    queries = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+class IdempotencyKey(models.Model):
+    """The stored outcome of a create request sent with an Idempotency-Key.
+
+    ``scope`` is a hash of the caller, path and key, so rows stay small and
+    lookups are by primary key. The response body is kept zlib-compressed.
+    """
+    STATUS_IN_PROGRESS = 'in_progress'
+    STATUS_DONE = 'done'
+
+    scope = models.CharField(max_length=64, primary_key=True)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=12, default=STATUS_IN_PROGRESS, choices=[
+        (STATUS_IN_PROGRESS, 'In progress'),
+        (STATUS_DONE, 'Done'),
+    ])
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_content_type = models.CharField(max_length=100, blank=True)
+    response_body = models.BinaryField(blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.scope
+
+class RevokedToken(models.Model):
+    """Refresh token ids that may no longer be exchanged for new tokens.
+
+    Only refresh tokens are tracked; access tokens are short-lived and are
+    never looked up, so authenticated requests stay query-free.
+    """
+    jti = models.CharField(max_length=64, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @classmethod
+    def revoke(cls, token):
+        """Revoke ``token`` and return False if it was already revoked.
+
+        Rows are useless once the token itself has expired;
+        `purge_revoked_tokens` deletes those.
+        """
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        try:
+            with transaction.atomic():
+                cls.objects.create(jti=token['jti'], expires_at=expires_at)
+        except IntegrityError:
+            return False
+        return True
+
+    def __str__(self):
+        return self.jti
+
+class ChunkedUpload(models.Model):
+    """A resumable listing image upload, received in chunks (core/uploads.py).
+
+    The bytes go straight to a ``.part`` file under UPLOAD_TEMP_DIR and
+    ``offset`` counts those committed so far. Once complete the file is
+    attached to a listing and the row goes; abandoned ones expire after
+    UPLOAD_SESSION_TTL without a chunk and `purge_uploads` removes them.
+    """
+    # Listing type -> model, for the types that have an image
+    KINDS = {kind: SellerStats.KINDS[kind][0] for kind in ('products', 'lands', 'inputs', 'services')}
+    MAX_OPEN_PER_USER = 10
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chunked_uploads'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_TEMP_DIR, f'{self.pk.hex}.part')
+
+    @property
+    def complete(self):
+        return self.offset == self.size
+
+    def discard(self):
+        """Delete the row and its partial file."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.delete()
+
+    @classmethod
+    def purge_expired(cls):
+        """Discard expired uploads and stray part files; return how many uploads went."""
+        expired = list(cls.objects.filter(expires_at__lte=timezone.now()))
+        for upload in expired:
+            upload.discard()
+        # Part files whose row is gone (e.g. a crash between the two deletes).
+        directory = settings.UPLOAD_TEMP_DIR
+        if os.path.isdir(directory):
+            cutoff = (timezone.now() - settings.UPLOAD_SESSION_TTL).timestamp()
+            names = {name for name in os.listdir(directory) if name.endswith('.part')}
+            live = {f'{pk.hex}.part' for pk in cls.objects.values_list('pk', flat=True)}
+            for name in names - live:
+                path = os.path.join(directory, name)
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+        return len(expired)
+
     def __str__(self):
-        return f"{self.title} by {self.user.username}"
\ No newline at end of file
+        return f'{self.filename} ({self.offset}/{self.size})'
@@ -0,0 +1,121 @@
+# core/profiling.py
+"""On-demand profiling of single requests for staff.
+
+A request carrying a valid ``X-Profile`` token (see `profiling_token`) runs
+under cProfile with every SQL statement timed. Afterwards each distinct
+SELECT is EXPLAINed and the lot is saved as a ProfileReport, which staff
+read in the admin. Requests without the header skip all of this after a
+single dictionary lookup.
+"""
+import cProfile
+import io
+import pstats
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+
+HEADER = 'HTTP_X_PROFILE'
+SALT = 'core.profiling'
+PROFILE_LINES = 40
+MAX_EXPLAINED = 50
+
+
+def make_token(user):
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+def token_user(token):
+    """The active staff user ``token`` was issued to, or None."""
+    from .models import User
+
+    try:
+        user_id = signing.TimestampSigner(salt=SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return User.objects.filter(pk=user_id, is_staff=True, is_active=True).first()
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': params,
+                'many': many,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+def explain(queries):
+    explained = {}
+    for query in queries:
+        key = (query['alias'], query['sql'])
+        if query['many'] or not query['sql'].lstrip().upper().startswith('SELECT'):
+            continue
+        if key not in explained and len(explained) < MAX_EXPLAINED:
+            connection = connections[query['alias']]
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"{connection.ops.explain_query_prefix()} {query['sql']}", query['params'])
+                    explained[key] = '\n'.join(' '.join(str(part) for part in row) for row in cursor.fetchall())
+            except Exception as e:
+                explained[key] = f'EXPLAIN failed: {e}'
+        query['explain'] = explained.get(key, '')
+    return queries
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get(HEADER)
+        if token is None:
+            return self.get_response(request)
+        user = token_user(token)
+        if user is None:
+            return self.get_response(request)
+        return self.profile(request, user)
+
+    def profile(self, request, user):
+        from .models import ProfileReport
+
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                duration = time.perf_counter() - start
+
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        queries = explain(recorder.queries)
+        report = ProfileReport.objects.create(
+            user=user,
+            method=request.method,
+            path=request.get_full_path()[:500],
+            status_code=response.status_code,
+            duration_ms=round(duration * 1000, 3),
+            query_count=len(queries),
+            sql_ms=round(sum(query['ms'] for query in queries), 3),
+            profile=stream.getvalue(),
+            queries=[{**query, 'params': repr(query['params'])} for query in queries],
+        )
+        response['X-Profile-Report'] = str(report.pk)
+        return response
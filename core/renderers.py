@@ -0,0 +1,26 @@
+# core/renderers.py
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Drop-in replacement for DRF's JSONRenderer backed by orjson.
+
+    Compact output is byte-for-byte identical to JSONRenderer; indented
+    (browsable API / ``indent=`` media type) output is left to DRF.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if (self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Anything orjson can't encode natively (Decimal, lazy strings,
+        # datetimes with DRF's 'Z' suffix, ...) goes through DRF's encoder.
+        ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
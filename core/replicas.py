@@ -0,0 +1,142 @@
+# core/replicas.py
+"""Send reads from safe-method requests to the read replicas.
+
+ReplicaMiddleware picks one healthy replica for each GET/HEAD/OPTIONS
+request and ReplicaRouter sends that request's reads to it, so a response
+never mixes rows from two replicas at different replication points. If the
+replica fails partway through, it is marked down and the request is served
+again from the primary. Everything else (writes, management commands, reads
+inside a transaction) stays on the primary.
+
+After a client writes, its reads stay on the primary for
+REPLICA_STICKY_SECONDS so it always sees its own changes despite
+replication lag. The client is recognised by a cookie, and for token
+clients (which may not keep cookies) by the user id in their access token.
+"""
+import contextvars
+import random
+import time
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.settings import api_settings
+
+PIN_COOKIE = 'primary_pin'
+
+# The replica chosen for the current request, or None for the primary
+_replica = contextvars.ContextVar('replica', default=None)
+# alias -> monotonic time until which it is considered down (per process)
+_down_until = {}
+
+
+def mark_down(alias):
+    _down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def is_healthy(alias):
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    connection = connections[alias]
+    try:
+        # ensure_connection() alone is a no-op on an open persistent
+        # connection, which may have died since the last request.
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+        connection.ensure_connection()
+    except DatabaseError:
+        mark_down(alias)
+        return False
+    _down_until.pop(alias, None)
+    return True
+
+
+def pick_replica():
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if is_healthy(alias):
+            return alias
+    return None
+
+
+def token_user_id(request):
+    # Unverified on purpose: the id only decides where this client's reads
+    # go, and the token is verified properly when the view authenticates.
+    header = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(header) != 2 or header[0] not in api_settings.AUTH_HEADER_TYPES:
+        return None
+    try:
+        payload = jwt.decode(header[1], options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return None
+    return payload.get(api_settings.USER_ID_CLAIM)
+
+
+def pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def is_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    user_id = token_user_id(request)
+    return user_id is not None and cache.get(pin_key(user_id)) is not None
+
+
+def pin(request, response):
+    seconds = settings.REPLICA_STICKY_SECONDS
+    response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else token_user_id(request)
+    if user_id is not None:
+        cache.set(pin_key(user_id), 1, seconds)
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            pin(request, response)
+            return response
+        alias = None if is_pinned(request) else pick_replica()
+        token = _replica.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica.reset(token)
+        if alias is not None and getattr(request, '_replica_failed', False):
+            # Safe methods can be repeated; serve this one from the primary.
+            mark_down(alias)
+            response = self.get_response(request)
+        return response
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, DatabaseError) and _replica.get() is not None:
+            request._replica_failed = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or connections['default'].in_atomic_block:
+            return 'default'
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication.
+        return db not in settings.DATABASE_REPLICAS
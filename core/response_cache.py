@@ -0,0 +1,140 @@
+# core/response_cache.py
+"""Shared cache of fully rendered GET responses for the public listing views.
+
+Every cached response is keyed by the request path, query string and
+negotiated media type, plus a generation token for each model (and, on
+detail views, each object) it was built from. Saving or deleting a listing
+replaces the matching tokens (see core.signals), which orphans exactly the
+responses that could contain it.
+"""
+import hashlib
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.crypto import get_random_string
+
+STATS_KEYS = {'hit': 'respcache:stats:hits', 'miss': 'respcache:stats:misses'}
+# Response headers stored along with the body
+CACHED_HEADERS = ('Content-Type', 'ETag')
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def generation_key(model, pk=None):
+    label = model._meta.label_lower
+    return f'respcache:gen:{label}' if pk is None else f'respcache:gen:{label}:{pk}'
+
+
+def invalidate(model, pk=None):
+    keys = [generation_key(model)]
+    if pk is not None:
+        keys.append(generation_key(model, pk))
+    # Fresh random tokens rather than counters: a token that was evicted and
+    # recreated can never collide with one an old response was stored under.
+    get_cache().set_many({key: get_random_string(12) for key in keys}, None)
+
+
+def get_generations(keys):
+    cache = get_cache()
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, get_random_string(12), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def record(outcome):
+    # Counting every request would add a read-modify-write of one shared key
+    # to each hit; a scaled-up sample is enough for the hit ratio.
+    rate = settings.RESPONSE_CACHE_STATS_SAMPLE_RATE
+    if not rate or random.random() >= rate:
+        return
+    cache = get_cache()
+    try:
+        cache.incr(STATS_KEYS[outcome], round(1 / rate))
+    except ValueError:
+        cache.add(STATS_KEYS[outcome], 0, None)
+        cache.incr(STATS_KEYS[outcome], round(1 / rate))
+
+
+def stats():
+    values = get_cache().get_many(STATS_KEYS.values())
+    return {outcome: values.get(key, 0) for outcome, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    get_cache().delete_many(STATS_KEYS.values())
+
+
+def cache_response(*models):
+    """Cache an APIView ``get`` method's rendered response.
+
+    ``models`` are the models the response is built from. When the view is
+    called with a ``pk``, the first model is tracked per object instead, so a
+    detail response only goes stale when its own row changes. Only anonymous
+    requests for JSON are served from cache.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.user.is_authenticated or request.accepted_renderer.format != 'json':
+                return method(view, request, *args, **kwargs)
+
+            if 'pk' in kwargs:
+                gen_keys = [generation_key(models[0], kwargs['pk'])]
+                gen_keys += [generation_key(model) for model in models[1:]]
+            else:
+                gen_keys = [generation_key(model) for model in models]
+            parts = [
+                request.path,
+                '&'.join(sorted(request.META.get('QUERY_STRING', '').split('&'))),
+                request.accepted_media_type,
+                *get_generations(gen_keys),
+            ]
+            key = 'respcache:resp:v2:' + hashlib.md5('|'.join(parts).encode()).hexdigest()
+            cache = get_cache()
+
+            cached = cache.get(key)
+            if cached is None:
+                # Dogpile protection: one request rebuilds the response while
+                # the others wait briefly for it to show up.
+                lock_key = key + ':lock'
+                if not cache.add(lock_key, 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+                    deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+                    while time.monotonic() < deadline and cache.get(lock_key) is not None:
+                        time.sleep(0.05)
+                    cached = cache.get(key)
+                    if cached is None:
+                        record('miss')
+                        return method(view, request, *args, **kwargs)
+                else:
+                    try:
+                        record('miss')
+                        response = method(view, request, *args, **kwargs)
+                        if response.status_code == 200:
+                            response.accepted_renderer = request.accepted_renderer
+                            response.accepted_media_type = request.accepted_media_type
+                            response.renderer_context = view.get_renderer_context()
+                            response.render()
+                            headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+                            cache.set(key, (response.status_code, response.content, headers),
+                                      settings.RESPONSE_CACHE_TIMEOUT)
+                        response['X-Cache'] = 'MISS'
+                        return response
+                    finally:
+                        cache.delete(lock_key)
+
+            record('hit')
+            status_code, content, headers = cached
+            response = HttpResponse(content, status=status_code, headers=headers)
+            response['X-Cache'] = 'HIT'
+            return response
+        return wrapper
+    return decorator
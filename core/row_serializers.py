@@ -0,0 +1,145 @@
+# core/row_serializers.py
+"""Fast read-only serialization of listing querysets.
+
+The list endpoints render hundreds of rows per response. A RowSerializer
+gives the same output as its ModelSerializer without building a model
+instance per row; core.serializers defines one per listing type
+(``product_rows`` and friends).
+"""
+import decimal
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+
+class RowSerializer:
+    """Read-only fast path for a ModelSerializer's list output.
+
+    The serializer's fields are compiled once into ``(key, column, mapper)``
+    triples, and objects are read with ``values_list()`` instead of being
+    instantiated as models. Mappers that depend on the active timezone are
+    bound once per ``serialize()`` call rather than once per value. Output
+    matches ``serializer_class(qs, many=True).data`` for a serializer used
+    without a request in its context.
+
+    ``strings`` maps StringRelatedField names to the column holding the
+    related object's ``__str__`` value, e.g. ``{'user': 'user__username'}``.
+    """
+
+    def __init__(self, serializer_class, strings=None):
+        self.serializer_class = serializer_class
+        self.strings = strings or {}
+        self._compiled = None
+
+    def compile(self):
+        # Deferred until first use so building the field map doesn't happen
+        # at import time.
+        if self._compiled is None:
+            columns = []
+            builders = self._compile_fields(self.serializer_class(), '', columns)
+            self._compiled = (columns, builders)
+        return self._compiled
+
+    def _compile_fields(self, serializer, prefix, columns):
+        builders = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.BaseSerializer):
+                # The related pk tells a missing relation (rendered as None)
+                # apart from one whose fields happen to be empty.
+                columns.append(f'{prefix}{field.source}__pk')
+                pk_index = len(columns) - 1
+                nested = self._compile_fields(field, f'{prefix}{field.source}__', columns)
+                builders.append((field.field_name, None, (pk_index, nested)))
+                continue
+            if isinstance(field, serializers.StringRelatedField):
+                column = self.strings[field.field_name]
+            else:
+                column = prefix + field.source.replace('.', '__')
+            columns.append(column)
+            builders.append((field.field_name, len(columns) - 1, self._mapper_factory(serializer, field)))
+        return builders
+
+    def _mapper_factory(self, serializer, field):
+        if isinstance(field, serializers.DateTimeField):
+            return self._datetime_mapper_factory(field)
+        mapper = self._mapper(serializer, field)
+        return lambda: mapper
+
+    def _mapper(self, serializer, field):
+        if isinstance(field, serializers.DecimalField):
+            return self._decimal_mapper(field)
+        if isinstance(field, serializers.FileField):
+            return self._file_mapper(serializer.Meta.model._meta.get_field(field.source).storage)
+        if isinstance(field, serializers.ChoiceField):
+            choices = field.choice_strings_to_values
+            return lambda value: choices.get(str(value), value) if value != '' else value
+        if isinstance(field, (serializers.CharField, serializers.IntegerField,
+                              serializers.BooleanField, serializers.StringRelatedField,
+                              serializers.ReadOnlyField)):
+            return None
+        return field.to_representation
+
+    def _decimal_mapper(self, field):
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if (not coerce_to_string or field.localize or field.normalize_output
+                or field.decimal_places is None or field.max_digits is None):
+            return field.to_representation
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        context.prec = field.max_digits
+        rounding = field.rounding
+        return lambda value: '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+
+    def _file_mapper(self, storage):
+        if not isinstance(storage, FileSystemStorage) or not storage.base_url.endswith('/'):
+            return lambda value: storage.url(value) if value else None
+        # FileSystemStorage.url() without the per-call urljoin().
+        base_url = storage.base_url
+        return lambda value: base_url + filepath_to_uri(value).lstrip('/') if value else None
+
+    def _datetime_mapper_factory(self, field):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if output_format is None or output_format.lower() != ISO_8601:
+            return lambda: field.to_representation
+
+        def bind():
+            tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+            if tz is None:
+                return field.to_representation
+
+            def to_iso(value):
+                if value.tzinfo is None:
+                    return field.to_representation(value)
+                value = value.astimezone(tz).isoformat()
+                if value.endswith('+00:00'):
+                    value = value[:-6] + 'Z'
+                return value
+            return to_iso
+        return bind
+
+    def _bind(self, builders):
+        return [
+            (key, index, (factory[0], self._bind(factory[1])) if index is None else factory())
+            for key, index, factory in builders
+        ]
+
+    def _build(self, builders, row):
+        item = {}
+        for key, index, mapper in builders:
+            if index is None:
+                pk_index, nested = mapper
+                item[key] = None if row[pk_index] is None else self._build(nested, row)
+                continue
+            value = row[index]
+            item[key] = value if value is None or mapper is None else mapper(value)
+        return item
+
+    def serialize(self, queryset):
+        columns, builders = self.compile()
+        builders = self._bind(builders)
+        build = self._build
+        return [build(builders, row) for row in queryset.values_list(*columns)]
@@ -1,7 +1,20 @@
 # core/serializers.py
+import os
+from datetime import timedelta
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Category, Product, Land, Input, Service, Video
+from django.core.files import File
+from django.core.validators import validate_image_file_extension
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from .row_serializers import RowSerializer
+from .models import EmailVerificationCode, Category, Product, Land, Input, Service, Video, VideoMetadata, Order, OrderLine, SellerStats, RevokedToken, SavedSearch, SearchAlert, ChunkedUpload
 
 User = get_user_model()
 
@@ -17,19 +30,43 @@ class RegisterSerializer(serializers.ModelSerializer):
         model = User
         fields = ['username', 'email', 'password']
     
+    @transaction.atomic
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password']
+        # Inactive until the emailed code is verified. One INSERT for the
+        # user and one for the code, in the same transaction.
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data['email']),
+            is_active=False,
         )
-        user.generate_verification_code()
+        user.set_password(validated_data['password'])
+        user.save()
+        self.verification_code = EmailVerificationCode.issue(user)
         return user
 
 class VerifyEmailSerializer(serializers.Serializer):
     email = serializers.EmailField()
     code = serializers.CharField(max_length=6)
 
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        # Revoking up front means a refresh token can be rotated only once,
+        # even when two clients race with the same token.
+        if not RevokedToken.revoke(refresh):
+            raise InvalidToken('Token has been revoked')
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if not User.objects.filter(**{api_settings.USER_ID_FIELD: user_id, 'is_active': True}).exists():
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        data = {'access': str(refresh.access_token)}
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+        data['refresh'] = str(refresh)
+        return data
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -41,32 +78,172 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ['id', 'user', 'category', 'name', 'description', 'price', 'quantity', 'image', 'created_at', 'updated_at']
+        fields = ['id', 'user', 'category', 'name', 'description', 'price', 'quantity', 'image', 'created_at', 'updated_at', 'version']
+        read_only_fields = ['version']
 
 class LandSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
 
     class Meta:
         model = Land
-        fields = ['id', 'user', 'title', 'description', 'size', 'location', 'price', 'is_for_sale', 'image', 'created_at', 'updated_at']
+        fields = ['id', 'user', 'title', 'description', 'size', 'location', 'price', 'is_for_sale', 'image', 'created_at', 'updated_at', 'version']
+        read_only_fields = ['version']
 
 class InputSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
 
     class Meta:
         model = Input
-        fields = ['id', 'user', 'name', 'description', 'price', 'quantity', 'image', 'created_at', 'updated_at']
+        fields = ['id', 'user', 'name', 'description', 'price', 'quantity', 'image', 'created_at', 'updated_at', 'version']
+        read_only_fields = ['version']
 
 class ServiceSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
 
     class Meta:
         model = Service
-        fields = ['id', 'user', 'title', 'description', 'price', 'location', 'image', 'created_at', 'updated_at']
+        fields = ['id', 'user', 'title', 'description', 'price', 'location', 'image', 'created_at', 'updated_at', 'version']
+        read_only_fields = ['version']
+
+class VideoMetadataSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoMetadata
+        fields = ['available', 'thumbnail_url', 'duration_seconds', 'view_count', 'fetched_at']
 
 class VideoSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
+    metadata = VideoMetadataSerializer(read_only=True)
 
     class Meta:
         model = Video
-        fields = ['id', 'title', 'youtube_video_id', 'description', 'user', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'title', 'youtube_video_id', 'description', 'user', 'metadata', 'created_at', 'updated_at', 'version']
+        read_only_fields = ['version']
+
+class SellerDashboardSerializer(serializers.ModelSerializer):
+    total_stock_value = serializers.DecimalField(max_digits=17, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = SellerStats
+        exclude = ['user']
+
+    def to_representation(self, instance):
+        instance.total_stock_value = instance.products_stock_value + instance.inputs_stock_value
+        flat = super().to_representation(instance)
+        data = {
+            kind: {key[len(kind) + 1:]: value for key, value in flat.items() if key.startswith(f'{kind}_')}
+            for kind in SellerStats.KINDS
+        }
+        data['total_stock_value'] = flat['total_stock_value']
+        return data
+
+# values()-backed fast paths used by the list endpoints
+product_rows = RowSerializer(ProductSerializer, strings={'user': 'user__username'})
+land_rows = RowSerializer(LandSerializer, strings={'user': 'user__username'})
+input_rows = RowSerializer(InputSerializer, strings={'user': 'user__username'})
+service_rows = RowSerializer(ServiceSerializer, strings={'user': 'user__username'})
+video_rows = RowSerializer(VideoSerializer, strings={'user': 'user__username'})
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLine
+        fields = ['id', 'product', 'input', 'quantity', 'unit_price']
+
+class OrderSerializer(serializers.ModelSerializer):
+    lines = OrderLineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'status', 'expires_at', 'lines', 'created_at', 'updated_at']
+
+class OrderLineRequestSerializer(serializers.Serializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all(), required=False)
+    input = serializers.PrimaryKeyRelatedField(queryset=Input.objects.all(), required=False)
+    quantity = serializers.IntegerField(min_value=1)
+
+    def validate(self, attrs):
+        if ('product' in attrs) == ('input' in attrs):
+            raise serializers.ValidationError('Each line needs exactly one of product or input.')
+        return attrs
+
+class OrderCreateSerializer(serializers.Serializer):
+    lines = OrderLineRequestSerializer(many=True, allow_empty=False, max_length=50)
+
+    def get_lines(self):
+        return [
+            (line.get('product') or line.get('input'), line['quantity'])
+            for line in self.validated_data['lines']
+        ]
+
+class PriceHistoryQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        end = attrs.setdefault('end', timezone.localdate())
+        start = attrs.setdefault('start', end - timedelta(days=90))
+        if start > end:
+            raise serializers.ValidationError('start must not be after end')
+        return attrs
+
+class PriceBucketSerializer(serializers.Serializer):
+    bucket = serializers.DateField()
+    open = serializers.DecimalField(max_digits=12, decimal_places=2)
+    high = serializers.DecimalField(max_digits=12, decimal_places=2)
+    low = serializers.DecimalField(max_digits=12, decimal_places=2)
+    close = serializers.DecimalField(max_digits=12, decimal_places=2)
+    changes = serializers.IntegerField()
+
+class PriceHistorySerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    period = serializers.CharField()
+    price_before_start = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    buckets = PriceBucketSerializer(many=True)
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavedSearch
+        fields = ['id', 'kind', 'category', 'min_price', 'max_price', 'location', 'keywords', 'created_at']
+
+    def validate(self, attrs):
+        fields = SavedSearch.FIELDS[attrs['kind']]
+        if attrs.get('category') and not fields['category']:
+            raise serializers.ValidationError({'category': f"{attrs['kind']} have no category"})
+        if attrs.get('location') and not fields['location']:
+            raise serializers.ValidationError({'location': f"{attrs['kind']} have no location"})
+        min_price, max_price = attrs.get('min_price'), attrs.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError('min_price must not be above max_price')
+        return attrs
+
+class SearchAlertSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SearchAlert
+        fields = ['id', 'saved_search', 'kind', 'listing_id', 'created_at', 'seen_at']
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    complete = serializers.BooleanField(read_only=True)
+    # The largest chunk a PUT may carry; clients size their chunks from it.
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChunkedUpload
+        fields = ['id', 'filename', 'size', 'offset', 'complete', 'chunk_size', 'expires_at']
+        read_only_fields = ['offset', 'expires_at']
+
+    def get_chunk_size(self, obj):
+        return settings.UPLOAD_CHUNK_MAX_SIZE
+
+    def validate_filename(self, value):
+        value = os.path.basename(value)
+        validate_image_file_extension(File(None, name=value))
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Images must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes')
+        return value
+
+class UploadAttachSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=list(ChunkedUpload.KINDS))
+    id = serializers.IntegerField()
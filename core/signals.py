@@ -0,0 +1,128 @@
+# core/signals.py
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from . import autocomplete, response_cache
+from .authentication import clear_deactivated, mark_deactivated
+from .models import Category, PricePoint, SellerStats
+
+LISTING_MODELS = [model for model, _ in SellerStats.KINDS.values()]
+
+
+def remember_seller_stats_base(sender, instance, **kwargs):
+    # What the row counted for when loaded, so saves can apply a difference.
+    instance._seller_stats_base = SellerStats.contribution(instance) if instance.pk else None
+
+
+def seller_stats_saved(sender, instance, created, **kwargs):
+    kind = SellerStats.kind_for(sender)
+    old = getattr(instance, '_seller_stats_base', None)
+    new = SellerStats.contribution(instance)
+    if new is None or (old is None and not created):
+        SellerStats.refresh(instance.user_id, [kind])
+    elif created:
+        SellerStats.add(new[0], kind, count=1, stock_value=new[1], activity=instance.updated_at)
+    elif old[0] != new[0]:
+        SellerStats.add(old[0], kind, count=-1, stock_value=-old[1])
+        SellerStats.add(new[0], kind, count=1, stock_value=new[1], activity=instance.updated_at)
+    else:
+        SellerStats.add(new[0], kind, stock_value=new[1] - old[1], activity=instance.updated_at)
+    instance._seller_stats_base = new
+
+
+def seller_stats_deleted(sender, instance, origin=None, **kwargs):
+    # When the seller themselves is being deleted their stats row goes too.
+    if origin is not None and getattr(origin, 'model', type(origin))._meta.label == settings.AUTH_USER_MODEL:
+        return
+    kind = SellerStats.kind_for(sender)
+    old = getattr(instance, '_seller_stats_base', None) or SellerStats.contribution(instance)
+    if old is None:
+        SellerStats.refresh(instance.user_id, [kind])
+    else:
+        SellerStats.add(old[0], kind, count=-1, stock_value=-old[1])
+
+
+def track_deactivation(sender, instance, created, update_fields=None, **kwargs):
+    # New users are inactive until verified but hold no tokens yet.
+    if created or (update_fields is not None and 'is_active' not in update_fields):
+        return
+    if instance.is_active:
+        clear_deactivated(instance.pk)
+    else:
+        mark_deactivated(instance.pk)
+
+
+def remember_price(sender, instance, **kwargs):
+    instance._loaded_price = instance.__dict__.get('price') if instance.pk else None
+
+
+def record_price(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Raw saves (restore_listing, loaddata) put back a listing whose
+    # history is already recorded.
+    if raw or (update_fields is not None and 'price' not in update_fields):
+        return
+    loaded = getattr(instance, '_loaded_price', None)
+    if created or loaded is None:
+        # New listings always start a history; otherwise we don't know the
+        # old price and let record() look it up.
+        PricePoint.record(instance, check_last=not created)
+    elif Decimal(str(loaded)) != Decimal(str(instance.price)):
+        PricePoint.record(instance, check_last=False)
+    instance._loaded_price = instance.price
+
+
+def update_autocomplete(sender, instance, **kwargs):
+    kind = SellerStats.kind_for(sender)
+    field = autocomplete.SOURCES[kind][1]
+    pk, title = instance.pk, getattr(instance, field)
+    transaction.on_commit(lambda: autocomplete.listing_saved(kind, pk, title))
+
+
+def remove_from_autocomplete(sender, instance, **kwargs):
+    kind, pk = SellerStats.kind_for(sender), instance.pk
+    transaction.on_commit(lambda: autocomplete.listing_deleted(kind, pk))
+
+
+def remember_username(sender, instance, **kwargs):
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+def invalidate_responses_for_username(sender, instance, created, **kwargs):
+    # Listing payloads show the seller's username.
+    if not created and instance.username != getattr(instance, '_loaded_username', None):
+        response_cache.invalidate(sender)
+        transaction.on_commit(lambda: response_cache.invalidate(sender))
+    instance._loaded_username = instance.username
+
+
+def invalidate_cached_responses(sender, instance, **kwargs):
+    # Once now, and again after commit in case a concurrent reader cached the
+    # old row in between.
+    pk = instance.pk
+    response_cache.invalidate(sender, pk)
+    transaction.on_commit(lambda: response_cache.invalidate(sender, pk))
+
+
+post_save.connect(track_deactivation, sender=settings.AUTH_USER_MODEL, dispatch_uid='auth-deactivation')
+post_init.connect(remember_username, sender=settings.AUTH_USER_MODEL, dispatch_uid='response-cache-username-init')
+post_save.connect(invalidate_responses_for_username, sender=settings.AUTH_USER_MODEL,
+                  dispatch_uid='response-cache-username')
+
+for model in LISTING_MODELS:
+    post_init.connect(remember_seller_stats_base, sender=model, dispatch_uid=f'seller-stats-init-{model.__name__}')
+    post_save.connect(seller_stats_saved, sender=model, dispatch_uid=f'seller-stats-save-{model.__name__}')
+    post_delete.connect(seller_stats_deleted, sender=model, dispatch_uid=f'seller-stats-delete-{model.__name__}')
+
+for model in LISTING_MODELS:
+    post_save.connect(update_autocomplete, sender=model, dispatch_uid=f'autocomplete-save-{model.__name__}')
+    post_delete.connect(remove_from_autocomplete, sender=model, dispatch_uid=f'autocomplete-delete-{model.__name__}')
+
+for model in PricePoint.MODELS.values():
+    post_init.connect(remember_price, sender=model, dispatch_uid=f'price-history-init-{model.__name__}')
+    post_save.connect(record_price, sender=model, dispatch_uid=f'price-history-{model.__name__}')
+
+for model in LISTING_MODELS + [Category]:
+    post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'response-cache-save-{model.__name__}')
+    post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'response-cache-delete-{model.__name__}')
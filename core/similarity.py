@@ -0,0 +1,354 @@
+# core/similarity.py
+"""Nearest-neighbour index behind the "similar listings" endpoints.
+
+Every listing is one L2-normalised float32 row: hashed TF-IDF over its
+name/title and description, followed by one-hot blocks for category, price
+band and location. Similarity is then a dot product, so a query is a single
+matrix-vector product over the index rather than a scan of the table.
+
+Each worker keeps its indexes in memory. ``rebuild_similarity_index`` writes
+them to SIMILARITY_INDEX_DIR, and workers memory-map those files so they
+share one copy of the matrix through the page cache. Changes made after the
+last rebuild are kept in a small in-memory overlay, so the shared matrix is
+never copied: the response cache generation token for the model moves on
+every save (see core.signals), and when it does, or every
+SIMILARITY_SYNC_SECONDS in any case, the index pulls in the rows updated
+since it last synced. Rebuilds fold the overlay back into the base.
+"""
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from . import response_cache
+from .models import Land, Product, Service
+
+TEXT_DIMENSIONS = 1024
+CATEGORY_DIMENSIONS = 16
+PRICE_BANDS = 12  # Half-decade bands from TSh 1 up to 1e6 and beyond
+LOCATION_DIMENSIONS = 64
+DIMENSIONS = TEXT_DIMENSIONS + CATEGORY_DIMENSIONS + PRICE_BANDS + LOCATION_DIMENSIONS
+
+# How much each block counts towards the cosine score.
+TEXT_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.5
+PRICE_WEIGHT = 0.35
+LOCATION_WEIGHT = 0.5
+
+TOKEN_RE = re.compile(r'\w\w+')
+# Rows saved within this window of the last sync are fetched again, so a
+# save that was in flight while we synced is never missed.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+@dataclass(frozen=True)
+class Spec:
+    title: str
+    category: str = None
+    location: str = None
+
+
+SPECS = {
+    Product: Spec(title='name', category='category_id'),
+    Land: Spec(title='title', location='location'),
+    Service: Spec(title='title', location='location'),
+}
+
+
+def bucket(token, size):
+    return zlib.crc32(token.encode()) % size
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def price_band(price):
+    if price is None or price <= 0:
+        return None
+    return min(PRICE_BANDS - 1, max(0, int(math.log10(float(price)) * 2)))
+
+
+class SimilarityIndex:
+    def __init__(self, model):
+        self.model = model
+        self.spec = SPECS[model]
+        # The base matrix comes from a build or a memory-mapped file and is
+        # never written to. Rows changed since then live in the small
+        # overlay, and the base rows they replace are listed in ``dead``.
+        self.matrix = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        self.pks = np.zeros(0, dtype=np.int64)
+        self.size = 0
+        self.positions = {}
+        self.dead = set()
+        self.overlay = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        self.overlay_pks = np.zeros(0, dtype=np.int64)
+        self.overlay_size = 0
+        self.overlay_positions = {}
+        self.doc_freq = np.zeros(TEXT_DIMENSIONS, dtype=np.int64)
+        self.documents = 0
+        self.synced_at = None
+        self.generation = None
+        self.checked_at = 0
+        self.source_mtime = None
+        self.lock = threading.RLock()
+
+    @property
+    def fields(self):
+        spec = self.spec
+        return ['pk', spec.title, 'description', 'price', spec.category or 'pk', spec.location or 'pk']
+
+    def text_terms(self, title, description):
+        terms = {}
+        # Titles are short and say what the listing is, so they count double.
+        for token in tokenize(title) * 2 + tokenize(description):
+            index = bucket(token, TEXT_DIMENSIONS)
+            terms[index] = terms.get(index, 0) + 1
+        return terms
+
+    def vector(self, terms, row):
+        _, _, _, price, category, location = row
+        vec = np.zeros(DIMENSIONS, dtype=np.float32)
+        if terms:
+            idf = np.log((1 + self.documents) / (1 + self.doc_freq)) + 1
+            for index, count in terms.items():
+                vec[index] = (1 + math.log(count)) * idf[index]
+            vec[:TEXT_DIMENSIONS] *= TEXT_WEIGHT / np.linalg.norm(vec[:TEXT_DIMENSIONS])
+        offset = TEXT_DIMENSIONS
+        if self.spec.category:
+            vec[offset + bucket(str(category), CATEGORY_DIMENSIONS)] = CATEGORY_WEIGHT
+        offset += CATEGORY_DIMENSIONS
+        band = price_band(price)
+        if band is not None:
+            vec[offset + band] = PRICE_WEIGHT
+            # Neighbouring bands still count for a little.
+            for near in (band - 1, band + 1):
+                if 0 <= near < PRICE_BANDS:
+                    vec[offset + near] = PRICE_WEIGHT / 3
+        offset += PRICE_BANDS
+        if self.spec.location:
+            places = tokenize(location)
+            for place in places:
+                vec[offset + bucket(place, LOCATION_DIMENSIONS)] += LOCATION_WEIGHT / math.sqrt(len(places))
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def set_base(self, matrix, pks):
+        self.matrix, self.pks, self.size = matrix, pks, len(pks)
+        self.positions = {pk: position for position, pk in enumerate(pks.tolist())}
+        self.dead = set()
+        self.overlay = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        self.overlay_pks = np.zeros(0, dtype=np.int64)
+        self.overlay_size = 0
+        self.overlay_positions = {}
+
+    def build(self):
+        """Rebuild the whole index from the database."""
+        with self.lock:
+            synced_at = timezone.now()
+            generation = self.current_generation()
+            rows = list(self.model.objects.order_by('pk').values_list(*self.fields).iterator())
+            terms = [self.text_terms(row[1], row[2]) for row in rows]
+            doc_freq = np.zeros(TEXT_DIMENSIONS, dtype=np.int64)
+            for document in terms:
+                doc_freq[list(document)] += 1
+            self.doc_freq, self.documents = doc_freq, len(rows)
+            matrix = np.zeros((len(rows), DIMENSIONS), dtype=np.float32)
+            for position, (row, document) in enumerate(zip(rows, terms)):
+                matrix[position] = self.vector(document, row)
+            self.set_base(matrix, np.array([row[0] for row in rows], dtype=np.int64))
+            self.synced_at, self.generation = synced_at, generation
+        return self
+
+    def merged(self):
+        """The live rows of base and overlay as one ``(matrix, pks)`` pair."""
+        live = np.ones(self.size, dtype=bool)
+        live[list(self.dead)] = False
+        overlay_live = self.overlay_pks[:self.overlay_size] >= 0
+        matrix = np.concatenate([self.matrix[:self.size][live], self.overlay[:self.overlay_size][overlay_live]])
+        pks = np.concatenate([self.pks[:self.size][live], self.overlay_pks[:self.overlay_size][overlay_live]])
+        return matrix, pks
+
+    def compact(self):
+        # Fold a large overlay into the base. A memory-mapped base is left to
+        # the next `rebuild_similarity_index` so workers keep sharing it.
+        if self.overlay_size > max(1024, self.size // 10) and not isinstance(self.matrix, np.memmap):
+            self.set_base(*self.merged())
+
+    def upsert(self, row):
+        """Add or replace one listing, given as a ``values_list`` row.
+
+        Weights use the current document frequencies; rows already in the
+        index keep theirs until the next full rebuild.
+        """
+        with self.lock:
+            pk = row[0]
+            terms = self.text_terms(row[1], row[2])
+            position = self.positions.get(pk)
+            if position is None and pk not in self.overlay_positions:
+                self.doc_freq[list(terms)] += 1
+                self.documents += 1
+            vec = self.vector(terms, row)
+            if position is not None:
+                if np.array_equal(self.matrix[position], vec):
+                    return
+                del self.positions[pk]
+                self.dead.add(position)
+            slot = self.overlay_positions.get(pk)
+            if slot is None:
+                if self.overlay_size == len(self.overlay):
+                    capacity = max(64, len(self.overlay) * 2)
+                    overlay = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+                    overlay[:self.overlay_size] = self.overlay[:self.overlay_size]
+                    overlay_pks = np.full(capacity, -1, dtype=np.int64)
+                    overlay_pks[:self.overlay_size] = self.overlay_pks[:self.overlay_size]
+                    self.overlay, self.overlay_pks = overlay, overlay_pks
+                slot = self.overlay_positions[pk] = self.overlay_size
+                self.overlay_pks[slot] = pk
+                self.overlay_size += 1
+            self.overlay[slot] = vec
+            self.compact()
+
+    def remove(self, pk):
+        with self.lock:
+            position = self.positions.pop(pk, None)
+            if position is not None:
+                self.dead.add(position)
+            slot = self.overlay_positions.pop(pk, None)
+            if slot is not None:
+                self.overlay_pks[slot] = -1
+
+    def current_generation(self):
+        return response_cache.get_generations([response_cache.generation_key(self.model)])[0]
+
+    def sync(self):
+        """Apply saves made since the last sync.
+
+        The response cache token tells us promptly when the model has
+        changed; every SIMILARITY_SYNC_SECONDS we look regardless, so a
+        disabled or flushed cache only delays updates.
+        """
+        generation = self.current_generation()
+        now = time.monotonic()
+        if generation == self.generation and now - self.checked_at < settings.SIMILARITY_SYNC_SECONDS:
+            return
+        with self.lock:
+            synced_at = timezone.now()
+            changed = self.model.objects.filter(updated_at__gte=self.synced_at - SYNC_OVERLAP)
+            for row in changed.values_list(*self.fields).iterator():
+                self.upsert(row)
+            self.synced_at, self.generation, self.checked_at = synced_at, generation, now
+
+    def neighbours(self, pk, limit):
+        """Return up to ``limit`` pks most similar to ``pk``, best first."""
+        with self.lock:
+            position, slot = self.positions.get(pk), self.overlay_positions.get(pk)
+            if position is not None:
+                query = self.matrix[position]
+            elif slot is not None:
+                query = self.overlay[slot]
+            else:
+                return []
+            pks = np.concatenate([self.pks[:self.size], self.overlay_pks[:self.overlay_size]])
+            base_scores = self.matrix[:self.size] @ query
+            base_scores[list(self.dead)] = -1
+            scores = np.concatenate([base_scores, self.overlay[:self.overlay_size] @ query])
+            scores[(pks < 0) | (pks == pk)] = -1
+            limit = min(limit, len(scores))
+            if limit <= 0:
+                return []
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [int(pks[i]) for i in top if scores[i] > 0]
+
+    def paths(self, directory):
+        name = self.model._meta.label_lower.replace('.', '-')
+        return os.path.join(directory, f'{name}.matrix.npy'), os.path.join(directory, f'{name}.meta.npz')
+
+    def save(self, directory):
+        """Write the index for other workers to memory-map."""
+        matrix_path, meta_path = self.paths(directory)
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            matrix, pks = self.merged()
+            # Meta first and the matrix last: workers reload when the matrix
+            # file changes, and os.replace makes each file switch atomic.
+            np.savez(meta_path + '.tmp.npz', pks=pks, doc_freq=self.doc_freq,
+                     documents=self.documents, synced_at=self.synced_at.timestamp())
+            os.replace(meta_path + '.tmp.npz', meta_path)
+            np.save(matrix_path + '.tmp.npy', matrix)
+            os.replace(matrix_path + '.tmp.npy', matrix_path)
+
+    def load(self, directory):
+        """Memory-map a saved index; return False if there isn't one."""
+        matrix_path, meta_path = self.paths(directory)
+        try:
+            mtime = os.stat(matrix_path).st_mtime
+            with np.load(meta_path) as meta:
+                pks, doc_freq = meta['pks'], meta['doc_freq']
+                documents, synced_at = int(meta['documents']), float(meta['synced_at'])
+            matrix = np.load(matrix_path, mmap_mode='r')
+        except FileNotFoundError:
+            return False
+        if len(matrix) != len(pks):
+            return False  # Caught between the two writes; try again later
+        with self.lock:
+            self.set_base(matrix, pks)
+            self.doc_freq, self.documents = doc_freq.copy(), documents
+            self.synced_at = datetime.fromtimestamp(synced_at, tz=dt_timezone.utc)
+            self.generation = None  # Always catch up on changes since the file was written
+            self.source_mtime = mtime
+        return True
+
+    def stale_file(self, directory):
+        try:
+            return os.stat(self.paths(directory)[0]).st_mtime != self.source_mtime
+        except FileNotFoundError:
+            return False
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(model):
+    """Return the up-to-date index for ``model``, loading or building it on first use."""
+    directory = settings.SIMILARITY_INDEX_DIR
+    with _indexes_lock:
+        index = _indexes.get(model)
+        if index is None:
+            index = _indexes[model] = SimilarityIndex(model)
+            if not (directory and index.load(directory)):
+                index.build()
+    if directory and index.stale_file(directory):
+        index.load(directory)
+    index.sync()
+    return index
+
+
+def similar(model, pk, limit=10):
+    """Return the pks of listings most like ``model`` ``pk``, best first.
+
+    A few extra candidates are scored so that rows deleted by another
+    worker can be dropped without coming up short.
+    """
+    index = get_index(model)
+    candidates = index.neighbours(pk, limit + 5)
+    existing = set(model.objects.filter(pk__in=candidates).values_list('pk', flat=True))
+    for missing in set(candidates) - existing:
+        index.remove(missing)
+    return [candidate for candidate in candidates if candidate in existing][:limit]
+
+
+def reset():
+    """Forget every loaded index (used by tests and after a rebuild)."""
+    with _indexes_lock:
+        _indexes.clear()
@@ -0,0 +1,71 @@
+# core/startup.py
+"""Measure how long a fresh worker takes to become ready to serve.
+
+The measurement runs in a child interpreter started with ``-X importtime``
+so nothing already imported by the caller skews the numbers.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+# Modules that must only be imported on first use, never at worker start.
+# (requests isn't listed: rest_framework.compat imports it whenever it is
+# installed, so deferring our own imports of it can't keep it out.)
+DEFERRED_MODULES = ('PIL', 'numpy')
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import django
+from django.apps import AppConfig
+ready_at = []
+original_ready = AppConfig.ready
+def timed_ready(self):
+    original_ready(self)
+    ready_at.append(time.perf_counter())
+AppConfig.ready = timed_ready
+django.setup()
+setup_done = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+done = time.perf_counter()
+print(json.dumps({
+    'ready_seconds': max(ready_at) - start,
+    'setup_seconds': setup_done - start,
+    'total_seconds': done - start,
+    'modules': sorted(sys.modules),
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """Return ``[(module, self_us, cumulative_us)]`` from ``-X importtime`` output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def measure_startup():
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'kilimopesa.settings'))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = report.pop('modules')
+    report['module_count'] = len(modules)
+    report['deferred_loaded'] = [
+        name for name in DEFERRED_MODULES
+        if any(module == name or module.startswith(name + '.') for module in modules)
+    ]
+    report['imports'] = parse_importtime(result.stderr)
+    return report
@@ -1,3 +1,1354 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .authentication import issue_tokens
+from .admin import EstimatedCountPaginator
+from .renderers import ORJSONRenderer
+from . import autocomplete, replicas, response_cache, serializers, similarity, uploads
+from .profiling import make_token
+from .startup import measure_startup
+from .views import ProductPriceHistory
+from .youtube import FakeYouTubeClient, parse_duration, refresh_metadata
+from .models import (
+    User, Category, Product, Land, Input, Service, Video, VideoMetadata, Order, OutOfStock, SellerStats, RevokedToken,
+    PricePoint, PriceRollup, ArchivedListing, SavedSearch, SearchAlert, ProfileReport,
+    EmailVerificationCode, ChunkedUpload, IdempotencyKey,
+)
+
+
+# Tests get their own cache rather than the shared one a dev server on the
+# same machine would use.
+TEST_CACHES = override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests'},
+})
+
+
+def setUpModule():
+    TEST_CACHES.enable()
+
+
+def tearDownModule():
+    TEST_CACHES.disable()
+
+
+def make_user(username='seller', **kwargs):
+    kwargs.setdefault('email', f'{username}@example.com')
+    kwargs.setdefault('is_email_verified', True)
+    return User.objects.create_user(username=username, password='pass12345', **kwargs)
+
+
+def make_listing(model, user, category=None, n=0):
+    fields = {
+        Product: dict(category=category, name=f'Maize {n}', description='d', price=Decimal('10.00'), quantity=5),
+        Land: dict(title=f'Shamba {n}', description='d', size=Decimal('2.00'), location='Morogoro', price=Decimal('1000.00')),
+        Input: dict(name=f'Urea {n}', description='d', price=Decimal('50.00'), quantity=10),
+        Service: dict(title=f'Tractor {n}', description='d', price=Decimal('20.00'), location='Dodoma'),
+        Video: dict(title=f'Kilimo {n}', youtube_video_id=f'vid{n}', description='d'),
+    }[model]
+    return model.objects.create(user=user, **fields)
+
+
+class TokenAuthTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+
+    def test_verify_email_issues_tokens(self):
+        user = make_user('buyer', is_email_verified=False, is_active=False)
+        code = EmailVerificationCode.issue(user)
+        response = self.client.post(reverse('verify-email'), {
+            'email': user.email, 'code': code, 'auth_mode': 'token',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data['tokens'])
+        self.assertIn('refresh', response.data['tokens'])
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_authenticated_read_needs_no_auth_queries(self):
+        Category.objects.create(name='nafaka')
+        tokens = issue_tokens(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        # The only query is the category list itself.
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_refresh_rotates_and_revokes_old_token(self):
+        refresh = issue_tokens(self.user)['refresh']
+        response = self.client.post(reverse('token-refresh'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], refresh)
+
+        response = self.client.post(reverse('token-refresh'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_revokes_refresh_token(self):
+        tokens = issue_tokens(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        response = self.client.post(reverse('logout'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+        response = self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_refuses_another_users_refresh_token(self):
+        other = issue_tokens(make_user('other'))['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {issue_tokens(self.user)['access']}")
+        response = self.client.post(reverse('logout'), {'refresh': other}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(RevokedToken.objects.exists())
+
+    def test_deactivation_rejects_existing_access_tokens(self):
+        access = issue_tokens(self.user)['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get(reverse('user-detail')).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('user-detail')).status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('user-detail')).status_code, 200)
+
+    def test_purge_revoked_tokens(self):
+        RevokedToken.objects.create(jti='old', expires_at=timezone.now() - timedelta(minutes=1))
+        RevokedToken.objects.create(jti='live', expires_at=timezone.now() + timedelta(days=1))
+        call_command('purge_revoked_tokens', stdout=io.StringIO())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.force_login(self.admin)
+        self.category = Category.objects.create(name='nafaka')
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:core_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelist_query_count_is_constant(self):
+        seller = make_user()
+        for model in (Product, Land, Input, Service, Video):
+            with self.subTest(model=model.__name__):
+                for n in range(3):
+                    make_listing(model, seller, self.category, n)
+                baseline = self.changelist_queries(model)
+                for n in range(3, 10):
+                    make_listing(model, seller, self.category, n)
+                self.assertEqual(self.changelist_queries(model), baseline)
+
+    def test_paginator_uses_estimate_for_unfiltered_tables(self):
+        for n in range(3):
+            make_listing(Video, self.admin, n=n)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        paginator = EstimatedCountPaginator(Video.objects.order_by('pk'), 100)
+        paginator.exact_count_threshold = 0
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(paginator.count, 3)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+        filtered = EstimatedCountPaginator(Video.objects.filter(title='Kilimo 1').order_by('pk'), 100)
+        filtered.exact_count_threshold = 0
+        self.assertEqual(filtered.count, 1)
+
+    def test_search_uses_indexes(self):
+        seller = make_user()
+        for name in ('Maize 1', 'Maize* seed', 'maize flour', 'Beans'):
+            Product.objects.create(user=seller, category=self.category, name=name, description='d',
+                                   price=Decimal('10.00'), quantity=5)
+        self.assertIn('USING INDEX', Product.objects.filter(name__prefix='Mai').explain())
+        self.assertEqual(sorted(Product.objects.filter(name__prefix='Maize').values_list('name', flat=True)),
+                         ['Maize 1', 'Maize* seed'])
+        self.assertEqual(list(Product.objects.filter(name__prefix='Maize*').values_list('name', flat=True)),
+                         ['Maize* seed'])
+
+        response = self.client.get(reverse('admin:core_product_changelist'), {'q': 'seller'})
+        self.assertEqual(response.context['cl'].result_count, 4)
+
+
+class OrderTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.buyer = make_user('buyer')
+        seller = make_user()
+        self.product = make_listing(Product, seller, Category.objects.create(name='nafaka'))
+        self.input = make_listing(Input, seller)
+        self.client.force_authenticate(self.buyer)
+
+    def test_multi_line_order_reserves_stock(self):
+        response = self.client.post(reverse('order-list'), {'lines': [
+            {'product': self.product.pk, 'quantity': 2},
+            {'input': self.input.pk, 'quantity': 10},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.input.refresh_from_db()
+        self.assertEqual((self.product.quantity, self.input.quantity), (3, 0))
+
+    def test_failed_line_rolls_back_whole_order(self):
+        response = self.client.post(reverse('order-list'), {'lines': [
+            {'product': self.product.pk, 'quantity': 2},
+            {'input': self.input.pk, 'quantity': 11},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['item_id'], self.input.pk)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_cancel_and_expiry_return_stock(self):
+        order = Order.reserve(self.buyer, [(self.product, 4)])
+        response = self.client.post(reverse('order-cancel', args=[order.pk]))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('order-cancel', args=[order.pk]))
+        self.assertEqual(response.status_code, 409)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 5)
+
+        order = Order.reserve(self.buyer, [(self.product, 4)])
+        Order.objects.filter(pk=order.pk).update(expires_at=order.expires_at - timedelta(days=1))
+        call_command('expire_reservations', stdout=open('/dev/null', 'w'))
+        order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((order.status, self.product.quantity), (Order.STATUS_EXPIRED, 5))
+        response = self.client.post(reverse('order-confirm', args=[order.pk]))
+        self.assertEqual(response.status_code, 409)
+
+
+class StockContentionTests(TransactionTestCase):
+    def test_concurrent_buyers_never_oversell(self):
+        seller = make_user()
+        product = make_listing(Product, seller, Category.objects.create(name='nafaka'))
+        Product.objects.filter(pk=product.pk).update(quantity=25)
+        buyers = [make_user(f'buyer{n}') for n in range(5)]
+        results, errors = [], []
+        start = threading.Barrier(40)
+
+        def checkout(n):
+            try:
+                start.wait()
+                for _ in range(2):
+                    try:
+                        Order.reserve(buyers[n % len(buyers)], [(product, 1)])
+                        results.append(True)
+                    except OutOfStock:
+                        results.append(False)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=checkout, args=(n,)) for n in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(errors, [])
+        self.assertEqual(results.count(True), 25)
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(Order.objects.count(), 25)
+
+
+class FastListSerializationTests(TestCase):
+    def setUp(self):
+        seller = make_user('mkulima\u2028wa_kwanza')
+        category = Category.objects.create(name='mazao_ya_biashara')
+        for n in range(3):
+            for model in (Product, Land, Input, Service, Video):
+                make_listing(model, seller, category, n)
+        Product.objects.filter(pk=Product.objects.first().pk).update(
+            name='Kahawa "AA" \u00e9 \u2029', image='products/kahawa ya mbeya.jpg', price=Decimal('0.50'))
+        Service.objects.filter(pk=Service.objects.first().pk).update(price=None)
+
+    def test_rows_match_model_serializers_byte_for_byte(self):
+        cases = [
+            (Product, serializers.ProductSerializer, serializers.product_rows),
+            (Land, serializers.LandSerializer, serializers.land_rows),
+            (Input, serializers.InputSerializer, serializers.input_rows),
+            (Service, serializers.ServiceSerializer, serializers.service_rows),
+            (Video, serializers.VideoSerializer, serializers.video_rows),
+        ]
+        for model, serializer_class, rows in cases:
+            with self.subTest(model=model.__name__):
+                queryset = model.objects.all()
+                expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+                self.assertEqual(ORJSONRenderer().render(rows.serialize(queryset)), expected)
+
+    def test_list_endpoint_uses_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product-list'))
+        expected = JSONRenderer().render(serializers.ProductSerializer(Product.objects.all(), many=True).data)
+        self.assertEqual(response.content, expected)
+
+    def test_renderer_matches_json_renderer_for_raw_values(self):
+        data = {'price': Decimal('12.50'), 'when': Product.objects.first().created_at, 1: ['\u2028', None, True]}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class SellerDashboardTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = make_user()
+        self.client.force_authenticate(self.seller)
+        category = Category.objects.create(name='nafaka')
+        self.products = [make_listing(Product, self.seller, category, n) for n in range(3)]
+        make_listing(Input, self.seller)
+        make_listing(Video, self.seller)
+
+    def test_dashboard_is_a_single_lookup(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('user-dashboard'))
+        self.assertEqual(response.data['products']['count'], 3)
+        self.assertEqual(response.data['products']['stock_value'], '150.00')
+        self.assertEqual(response.data['inputs']['stock_value'], '500.00')
+        self.assertEqual(response.data['total_stock_value'], '650.00')
+        self.assertEqual(response.data['lands']['count'], 0)
+        self.assertIsNotNone(response.data['videos']['last_activity'])
+
+    def test_counters_follow_saves_deletes_and_orders(self):
+        product = self.products[0]
+        product.price = Decimal('20.00')
+        product.save()
+        self.products[1].delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.reserve(make_user('buyer'), [(self.products[2], 5)])
+        self.assertEqual(SellerStats.compute(self.seller.pk), {
+            key: value for key, value in SellerStats.objects.filter(pk=self.seller.pk).values().get().items()
+            if key != 'user_id'
+        })
+        stats = SellerStats.objects.get(pk=self.seller.pk)
+        self.assertEqual((stats.products_count, stats.products_stock_value), (2, Decimal('100.00')))
+
+    def test_saves_apply_deltas_without_recounting(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.quantity = 10
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+            make_listing(Product, self.seller, product.category, n=9)
+            self.products[1].delete()
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('SUM(', sql)
+        stats = SellerStats.objects.get(pk=self.seller.pk)
+        self.assertEqual((stats.products_count, stats.products_stock_value), (3, Decimal('200.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.reserve(make_user('buyer'), [(product, 4)])
+        with self.captureOnCommitCallbacks(execute=True):
+            order.release()
+        SellerStats.objects.filter(pk=self.seller.pk).update(products_count=0)
+        call_command('rebuild_seller_stats', stdout=io.StringIO())
+        stats = SellerStats.objects.get(pk=self.seller.pk)
+        self.assertEqual((stats.products_count, stats.products_stock_value), (3, Decimal('200.00')))
+
+    def test_missing_row_is_backfilled(self):
+        SellerStats.objects.all().delete()
+        response = self.client.get(reverse('user-dashboard'))
+        self.assertEqual(response.data['products']['count'], 3)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.seller = make_user()
+        self.category = Category.objects.create(name='nafaka')
+        self.product = make_listing(Product, self.seller, self.category)
+
+    def get(self, name, *args):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(name, args=args))
+        return response, len(ctx.captured_queries)
+
+    @override_settings(RESPONSE_CACHE_STATS_SAMPLE_RATE=1)
+    def test_second_anonymous_get_is_served_from_cache(self):
+        first, first_queries = self.get('product-list')
+        second, second_queries = self.get('product-list')
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual((first_queries, second_queries), (1, 0))
+        self.assertEqual(response_cache.stats(), {'hit': 1, 'miss': 1})
+
+    def test_saves_invalidate_only_affected_responses(self):
+        other = make_listing(Product, self.seller, self.category, n=1)
+        for args in ((), (self.product.pk,), (other.pk,)):
+            self.get('product-list' if not args else 'product-detail', *args)
+        self.get('video-list')
+
+        self.product.name = 'Mtama'
+        self.product.save()
+
+        response, _ = self.get('product-list')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Mtama')
+        self.assertEqual(self.get('product-detail', self.product.pk)[0]['X-Cache'], 'MISS')
+        self.assertEqual(self.get('product-detail', other.pk)[0]['X-Cache'], 'HIT')
+        self.assertEqual(self.get('video-list')[0]['X-Cache'], 'HIT')
+
+    def test_username_change_invalidates_listings(self):
+        self.get('product-list')
+        self.get('product-detail', self.product.pk)
+        self.seller.last_name = 'Mushi'
+        self.seller.save()
+        self.assertEqual(self.get('product-list')[0]['X-Cache'], 'HIT')
+
+        self.seller.username = 'mkulima'
+        self.seller.save()
+        response, _ = self.get('product-detail', self.product.pk)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'mkulima')
+        self.assertContains(self.get('product-list')[0], 'mkulima')
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_login(self.seller)
+        response, _ = self.get('product-list')
+        self.assertNotIn('X-Cache', response)
+
+
+class VideoMetadataTests(TestCase):
+    def setUp(self):
+        seller = make_user()
+        for n in range(110):
+            make_listing(Video, seller, n=n)
+        # Two listings of the same YouTube video share one upstream lookup.
+        Video.objects.create(user=seller, title='Repost', youtube_video_id='vid7', description='d')
+
+    def test_refresh_batches_distinct_ids(self):
+        client = FakeYouTubeClient()
+        self.assertEqual(refresh_metadata(client), 111)
+        self.assertEqual([len(batch) for batch in client.calls], [50, 50, 10])
+        self.assertEqual(VideoMetadata.objects.filter(thumbnail_url__contains='/vid7/').count(), 2)
+
+        self.assertEqual(refresh_metadata(client), 0)
+        self.assertEqual(len(client.calls), 3)
+        self.assertEqual(refresh_metadata(client, max_age=timedelta(0)), 111)
+
+    def test_list_reads_stored_metadata_only(self):
+        refresh_metadata(FakeYouTubeClient())
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('video-list'))
+        video = next(v for v in response.json() if v['youtube_video_id'] == 'vid1')
+        self.assertEqual(video['metadata']['thumbnail_url'], 'https://i.ytimg.com/vi/vid1/hqdefault.jpg')
+        expected = JSONRenderer().render(serializers.VideoSerializer(Video.objects.all(), many=True).data)
+        self.assertEqual(response.content, expected)
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration('PT4M13S'), 253)
+        self.assertEqual(parse_duration('P1DT1H'), 90000)
+        self.assertIsNone(parse_duration('garbage'))
+
+
+class StartupBudgetTests(SimpleTestCase):
+    # Checked by what a worker imports rather than how long it takes, which
+    # depends on the machine. Raise deliberately if a new dependency needs it.
+    MAX_MODULES = 1000
+
+    def test_worker_startup_defers_heavy_imports(self):
+        report = measure_startup()
+        self.assertEqual(report['deferred_loaded'], [])
+        self.assertLessEqual(report['module_count'], self.MAX_MODULES)
+
+
+class GunicornTuningTests(SimpleTestCase):
+    def test_workers_follow_cpu_count_and_profile(self):
+        from kilimopesa.gunicorn_config import tune
+
+        sync = tune('sync', cpus=4, environ={})
+        gthread = tune('gthread', cpus=4, environ={'WEB_THREADS': '8'})
+        asgi = tune('asgi', cpus=4, environ={})
+        self.assertEqual((sync['workers'], sync['threads']), (9, 1))
+        self.assertEqual((gthread['workers'], gthread['threads']), (5, 8))
+        self.assertEqual(asgi['wsgi_app'], 'kilimopesa.asgi:application')
+        self.assertTrue(all(config['preload_app'] for config in (sync, gthread, asgi)))
+        self.assertEqual(sync['max_requests_jitter'], 100)
+        self.assertEqual(tune('sync', cpus=4, environ={'WEB_CONCURRENCY': '2'})['workers'], 2)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = make_user()
+        self.category = Category.objects.create(name='nafaka')
+
+    def post_land(self, key, **overrides):
+        data = {'title': 'Shamba', 'description': 'd', 'size': '2.00', 'location': 'Morogoro', 'price': '1000.00'}
+        data.update(overrides)
+        return self.client.post(reverse('land-list'), data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_stored_response(self):
+        self.client.force_authenticate(self.seller)
+        first = self.post_land('abc')
+        retry = self.post_land('abc')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Land.objects.count(), 1)
+
+        self.assertEqual(self.post_land('abc', title='Other').status_code, 422)
+        self.assertEqual(self.post_land('def').status_code, 201)
+        self.assertEqual(Land.objects.count(), 2)
+
+    def test_register_retry_sends_one_email(self):
+        data = {'username': 'mkulima', 'email': 'mkulima@example.com', 'password': 'pass12345'}
+        for _ in range(3):
+            response = self.client.post(reverse('register'), data, format='json', HTTP_IDEMPOTENCY_KEY='reg-1')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(User.objects.filter(username='mkulima').count(), 1)
+
+    def test_anonymous_clients_sharing_a_key_are_kept_apart(self):
+        data = {'username': 'mkulima', 'email': 'mkulima@example.com', 'password': 'pass12345'}
+        first = self.client.post(reverse('register'), data, format='json', HTTP_IDEMPOTENCY_KEY='1')
+        other = self.client.post(reverse('register'), {**data, 'username': 'mvuvi', 'email': 'mvuvi@example.com'},
+                                 format='json', HTTP_IDEMPOTENCY_KEY='1')
+        self.assertEqual((first.status_code, other.status_code), (201, 201))
+        self.assertNotIn('Idempotent-Replayed', other)
+        self.assertTrue(User.objects.filter(username='mvuvi').exists())
+
+    def test_fingerprints_do_not_expose_passwords(self):
+        data = {'username': 'mkulima', 'email': 'mkulima@example.com', 'password': 'pass12345'}
+        self.client.post(reverse('register'), data, format='json', HTTP_IDEMPOTENCY_KEY='reg-1')
+        stored = IdempotencyKey.objects.get().fingerprint
+        for payload in (data, {key: [value] for key, value in data.items()}):
+            self.assertNotEqual(stored, hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest())
+        # The password isn't part of it at all.
+        self.client.post(reverse('register'), {**data, 'password': 'other12345'}, format='json',
+                         HTTP_IDEMPOTENCY_KEY='reg-2')
+        self.assertEqual(set(IdempotencyKey.objects.values_list('fingerprint', flat=True)), {stored})
+
+
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    def test_concurrent_duplicates_wait_for_first_request(self):
+        seller = make_user()
+        responses, errors = [], []
+        start = threading.Barrier(6)
+
+        def submit():
+            try:
+                client = APIClient()
+                client.force_authenticate(seller)
+                start.wait()
+                responses.append(client.post(reverse('video-list'), {
+                    'title': 'Kilimo', 'youtube_video_id': 'abc', 'description': 'd',
+                }, format='json', HTTP_IDEMPOTENCY_KEY='same-key'))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=submit) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Video.objects.count(), 1)
+        self.assertEqual({response.status_code for response in responses}, {201})
+        self.assertEqual(len({response.content for response in responses}), 1)
+
+
+class SimilarListingsTests(TestCase):
+    def setUp(self):
+        similarity.reset()
+        self.addCleanup(similarity.reset)
+        self.client = APIClient()
+        self.seller = make_user()
+        self.grain = Category.objects.create(name='nafaka')
+        self.cash = Category.objects.create(name='mazao_ya_biashara')
+
+    def product(self, name, description, category, price):
+        return Product.objects.create(user=self.seller, category=category, name=name,
+                                      description=description, price=Decimal(price), quantity=5)
+
+    def similar_names(self, product):
+        response = self.client.get(reverse('product-similar', args=[product.pk]))
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data]
+
+    def test_ranks_by_text_category_and_price(self):
+        maize = self.product('White maize', 'Dry white maize grain from Mbeya', self.grain, '900.00')
+        self.product('Yellow maize', 'Maize grain, well dried', self.grain, '950.00')
+        self.product('Maize flour', 'Sifted maize flour', self.cash, '50000.00')
+        self.product('Cashew nuts', 'Raw cashew from Mtwara', self.cash, '5000.00')
+        self.assertEqual(self.similar_names(maize), ['Yellow maize', 'Maize flour', 'Cashew nuts'])
+        self.assertEqual(self.client.get(reverse('product-similar', args=[maize.pk]), {'limit': 1}).data[0]['name'],
+                         'Yellow maize')
+        self.assertEqual(self.client.get(reverse('product-similar', args=[999])).status_code, 404)
+
+    def test_index_follows_saves_and_deletes(self):
+        maize = self.product('White maize', 'Dry maize grain', self.grain, '900.00')
+        cashew = self.product('Cashew nuts', 'Raw cashew', self.cash, '5000.00')
+        self.assertEqual(self.similar_names(maize), ['Cashew nuts'])
+
+        self.product('Maize grain', 'Dry maize', self.grain, '900.00')
+        cashew.delete()
+        with self.assertNumQueries(4):  # the listing, changed rows, live candidates, ranked rows
+            self.assertEqual(self.similar_names(maize), ['Maize grain'])
+
+    def test_saved_index_is_memory_mapped(self):
+        maize = self.product('White maize', 'Dry maize grain', self.grain, '900.00')
+        self.product('Yellow maize', 'Dry maize grain', self.grain, '900.00')
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        with self.settings(SIMILARITY_INDEX_DIR=directory):
+            call_command('rebuild_similarity_index', stdout=io.StringIO())
+            index = similarity.get_index(Product)
+            self.assertFalse(index.matrix.flags.writeable)
+            self.assertEqual(self.similar_names(maize), ['Yellow maize'])
+
+            # Changes go to the overlay; the shared matrix is never copied.
+            self.product('Maize grain', 'Dry maize grain', self.grain, '900.00')
+            maize.description = 'Sweet corn'
+            maize.save()
+            self.assertEqual(self.similar_names(maize)[0], 'Maize grain')
+            self.assertIsInstance(similarity.get_index(Product).matrix, similarity.np.memmap)
+            self.assertEqual(similarity.get_index(Product).overlay_size, 2)
+
+        land = make_listing(Land, self.seller)
+        other = make_listing(Land, self.seller, n=1)
+        response = self.client.get(reverse('land-similar', args=[land.pk]))
+        self.assertEqual([row['id'] for row in response.data], [other.pk])
+
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+                       SIMILARITY_SYNC_SECONDS=0)
+    def test_updates_do_not_depend_on_the_cache(self):
+        maize = self.product('White maize', 'Dry maize grain', self.grain, '900.00')
+        self.product('Cashew nuts', 'Raw cashew', self.cash, '5000.00')
+        self.assertEqual(self.similar_names(maize), ['Cashew nuts'])
+        self.product('Maize grain', 'Dry maize', self.grain, '900.00')
+        self.assertEqual(self.similar_names(maize)[0], 'Maize grain')
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete.reset()
+        self.addCleanup(autocomplete.reset)
+        self.client = APIClient()
+        self.seller = make_user()
+        self.category = Category.objects.create(name='nafaka')
+        for name in ('White maize', 'White maize', 'Maize flour', 'Tomatoes'):
+            Product.objects.create(user=self.seller, category=self.category, name=name, description='',
+                                   price=Decimal('900.00'), quantity=5)
+        Land.objects.create(user=self.seller, title='Maize farm in Mbeya', description='', price=Decimal('1000000.00'),
+                            size=Decimal('2.00'), location='Mbeya')
+
+    def suggest(self, q, **params):
+        response = self.client.get(reverse('autocomplete'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['text'] for row in response.data]
+
+    def test_prefix_matches_rank_title_starts_first(self):
+        self.assertEqual(self.suggest('mai'), ['Maize farm in Mbeya', 'Maize flour', 'White maize'])
+        self.assertEqual(self.suggest('white m'), ['White maize'])
+        self.assertEqual(self.suggest('mai', limit=1), ['Maize farm in Mbeya'])
+        self.assertEqual(self.suggest('  '), [])
+        row = self.client.get(reverse('autocomplete'), {'q': 'white'}).data[0]
+        self.assertEqual(row, {'text': 'White maize', 'kinds': ['products'], 'count': 2})
+
+    def test_tolerates_typos(self):
+        self.assertEqual(self.suggest('tomatos'), ['Tomatoes'])
+        self.assertEqual(self.suggest('mbeyya'), ['Maize farm in Mbeya'])
+        self.assertEqual(self.suggest('xyz'), [])
+
+    def test_follows_saves_and_deletes_without_queries(self):
+        self.suggest('mai')  # Build the index
+        with self.captureOnCommitCallbacks(execute=True):
+            Input.objects.create(user=self.seller, name='Maize seed', description='', price=Decimal('10.00'),
+                                 quantity=5)
+            Product.objects.filter(name='Maize flour').get().delete()
+        index = autocomplete.get_index()
+        with self.assertNumQueries(0):
+            self.assertEqual([row['text'] for row in index.suggest('maize s')], ['Maize seed'])
+            self.assertEqual([row['text'] for row in index.suggest('flour')], [])
+
+    def test_budget_keeps_most_common_titles(self):
+        with self.settings(AUTOCOMPLETE_MAX_TITLES=1):
+            self.assertEqual(self.suggest('ma'), ['White maize'])
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.create(user=self.seller, category=self.category, name='Mangoes', description='',
+                                       price=Decimal('5.00'), quantity=5)
+            self.assertEqual(self.suggest('ma'), ['White maize'])
+
+    def test_single_letters_are_not_searched(self):
+        self.assertEqual(self.suggest('m'), [])
+        self.assertEqual(self.suggest('w flour'), ['Maize flour'])
+        self.assertEqual(self.suggest('flour m'), ['Maize flour'])
+
+    def test_rebuilds_in_the_background(self):
+        index = autocomplete.get_index()
+        fresh = autocomplete.AutocompleteIndex()
+        fresh.add('products', 99, 'Mangoes')
+        release = threading.Event()
+
+        def load():
+            release.wait(5)
+            return fresh
+
+        index.rebuild_at = 0
+        with mock.patch.object(index, 'load', side_effect=load) as loading:
+            autocomplete.get_index()
+            autocomplete.get_index()
+            # The old index keeps answering until the new one is ready.
+            self.assertEqual(self.suggest('tom'), ['Tomatoes'])
+            release.set()
+            for thread in threading.enumerate():
+                if thread.name == 'autocomplete-rebuild':
+                    thread.join()
+        self.assertEqual(loading.call_count, 1)
+        self.assertEqual(self.suggest('man'), ['Mangoes'])
+        self.assertGreater(index.rebuild_at, time.monotonic())
+
+    def test_forked_workers_draw_their_own_rebuild_time(self):
+        index = autocomplete.get_index()
+        index.rebuild_at = 0  # As inherited from a long-running master
+        schedules = set()
+        for _ in range(5):
+            autocomplete.reschedule()
+            schedules.add(index.rebuild_at)
+        interval = settings.AUTOCOMPLETE_REBUILD_SECONDS
+        self.assertEqual(len(schedules), 5)
+        self.assertTrue(all(time.monotonic() + interval * 0.4 < at <= time.monotonic() + interval for at in schedules))
+
+
+class PriceHistoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = make_user()
+        self.product = make_listing(Product, self.seller, Category.objects.create(name='nafaka'))
+
+    def history(self, **params):
+        response = self.client.get(reverse('product-price-history', args=[self.product.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_price_changes_are_appended(self):
+        self.client.force_authenticate(self.seller)
+        url = reverse('product-detail', args=[self.product.pk])
+        self.client.put(url, {'price': '12.00'}, format='json')
+        self.client.put(url, {'quantity': 3}, format='json')
+        self.client.put(url, {'price': '11.00'}, format='json')
+        points = PricePoint.objects.filter(kind=PricePoint.KIND_PRODUCT, listing_id=self.product.pk)
+        self.assertEqual([str(price) for price in points.order_by('pk').values_list('price', flat=True)],
+                         ['10.00', '12.00', '11.00'])
+
+        call_command('rollup_price_history', stdout=open('/dev/null', 'w'))
+        data = self.history()
+        self.assertEqual(data['period'], 'day')
+        self.assertEqual(data['buckets'], [{
+            'bucket': timezone.localdate().isoformat(), 'open': '10.00', 'high': '12.00',
+            'low': '10.00', 'close': '11.00', 'changes': 3,
+        }])
+
+    def test_long_ranges_are_downsampled(self):
+        PricePoint.objects.all().delete()
+        start = datetime(2020, 1, 1, 12, tzinfo=timezone.get_current_timezone())
+        PricePoint.objects.bulk_create([
+            PricePoint(kind=PricePoint.KIND_PRODUCT, listing_id=self.product.pk,
+                       price=Decimal(100 + day % 30), recorded_at=start + timedelta(days=day))
+            for day in range(0, 6 * 365, 3)
+        ])
+        PriceRollup.rollup()
+
+        data = self.history(start='2020-01-01', end='2020-03-31')
+        self.assertEqual(data['period'], 'day')
+        self.assertEqual(len(data['buckets']), 31)
+
+        data = self.history(start='2020-06-01', end='2025-12-31')
+        self.assertEqual(data['period'], 'week')
+        self.assertLessEqual(len(data['buckets']), ProductPriceHistory.max_points)
+        self.assertEqual(data['price_before_start'], str(PriceRollup.objects.filter(
+            period='week', bucket__lt=date(2020, 6, 1)).latest('bucket').close))
+
+        response = self.client.get(reverse('product-price-history', args=[self.product.pk]),
+                                   {'start': '2021-01-02', 'end': '2021-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_weekly_ranges_starting_midweek_stay_within_max_points(self):
+        max_points = ProductPriceHistory.max_points
+        start = date(2020, 1, 1)  # A Wednesday
+        PriceRollup.objects.bulk_create([
+            PriceRollup(kind=PricePoint.KIND_PRODUCT, listing_id=self.product.pk, period='week',
+                        bucket=date(2019, 12, 30) + timedelta(weeks=week), open=1, high=1, low=1,
+                        close=1, changes=1)
+            for week in range(max_points + 1)
+        ])
+        data = self.history(start=start.isoformat(),
+                            end=(start + timedelta(weeks=max_points, days=-1)).isoformat())
+        self.assertEqual(data['period'], 'week')
+        self.assertLessEqual(len(data['buckets']), max_points)
+
+    def test_saves_that_keep_the_price_skip_the_history_lookup(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.quantity += 1
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        self.assertFalse([q for q in queries.captured_queries if 'core_pricepoint' in q['sql']])
+        product.price = Decimal('15.00')
+        product.save()
+        self.assertEqual(PricePoint.objects.filter(listing_id=product.pk).count(), 2)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = make_user()
+        self.category = Category.objects.create(name='nafaka')
+        self.old = timezone.now() - timedelta(days=200)
+
+    def test_stale_listings_move_to_archive_and_back(self):
+        sold = make_listing(Land, self.seller)
+        for_sale = make_listing(Land, self.seller, n=1)
+        sold_out = make_listing(Product, self.seller, self.category)
+        ordered = make_listing(Product, self.seller, self.category, n=1)
+        Order.reserve(self.seller, [(ordered, 1)])
+        Land.objects.filter(pk=sold.pk).update(is_for_sale=False, updated_at=self.old)
+        Land.objects.filter(pk=for_sale.pk).update(updated_at=self.old)
+        Product.objects.update(quantity=0, updated_at=self.old)
+
+        call_command('archive_listings', batch_size=1, stdout=open('/dev/null', 'w'))
+        self.assertEqual(list(Land.objects.values_list('pk', flat=True)), [for_sale.pk])
+        self.assertEqual(list(Product.objects.values_list('pk', flat=True)), [ordered.pk])
+        self.assertEqual(ArchivedListing.objects.count(), 2)
+
+        self.assertEqual([row['id'] for row in self.client.get(reverse('land-list')).data], [for_sale.pk])
+        response = self.client.get(reverse('land-detail', args=[sold.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['archived'])
+        self.assertEqual(response.data['title'], sold.title)
+        self.assertEqual(self.client.get(reverse('land-detail', args=[999])).status_code, 404)
+
+        call_command('restore_listing', 'lands', sold.pk, stdout=open('/dev/null', 'w'))
+        restored = Land.objects.get(pk=sold.pk)
+        self.assertEqual(restored.updated_at, self.old)
+        self.assertFalse(ArchivedListing.objects.filter(kind='lands').exists())
+        self.assertNotIn('archived', self.client.get(reverse('land-detail', args=[sold.pk])).data)
+
+    def test_archive_and_restore_leave_price_history_alone(self):
+        product = make_listing(Product, self.seller, self.category)
+        points = PricePoint.objects.filter(listing_id=product.pk)
+        self.assertEqual(points.count(), 1)
+        ArchivedListing.archive(Product.objects.filter(pk=product.pk))
+        call_command('restore_listing', 'products', product.pk, stdout=io.StringIO())
+        self.assertEqual(points.count(), 1)
+
+
+class ReadOnlyRequestTests(TransactionTestCase):
+    """Reads must not open transactions, which take SQLite's write lock."""
+
+    def test_reads_run_in_autocommit(self):
+        autocomplete.reset()
+        similarity.reset()
+        self.addCleanup(autocomplete.reset)
+        self.addCleanup(similarity.reset)
+        seller = make_user(is_staff=True, is_superuser=True)
+        product = make_listing(Product, seller, Category.objects.create(name='nafaka'))
+        make_listing(Land, seller)
+        client = APIClient()
+        admin_client = APIClient()
+        admin_client.force_login(seller)
+        with CaptureQueriesContext(connection) as queries:
+            for url, params in [
+                (reverse('land-list'), {}),
+                (reverse('product-list'), {'ids': f'{product.pk},999'}),
+                (reverse('product-detail', args=[product.pk]), {}),
+                (reverse('product-similar', args=[product.pk]), {}),
+                (reverse('product-price-history', args=[product.pk]), {}),
+                (reverse('autocomplete'), {'q': 'mai'}),
+            ]:
+                self.assertEqual(client.get(url, params).status_code, 200, url)
+            self.assertEqual(admin_client.get(reverse('admin:core_product_changelist')).status_code, 200)
+        self.assertEqual([q['sql'] for q in queries.captured_queries if q['sql'].startswith('BEGIN')], [])
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routes against a second SQLite file standing in for a replica.
+
+    Nothing replicates into it, so a read that lands on it sees none of
+    the rows written to the primary.
+    """
+    # Resolved when the class is set up, which picks up the alias below.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_path = tempfile.mktemp(suffix='.sqlite3')
+        connections.settings['replica'] = {**connections.settings['default'], 'NAME': cls.replica_path}
+        call_command('migrate', database='replica', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        replicas._down_until.clear()
+        response_cache.get_cache().clear()
+        self.seller = make_user()
+        make_listing(Land, self.seller)
+
+    def land_count(self, client):
+        return len(client.get(reverse('land-list')).json())
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_reads_go_to_replica_until_client_writes(self):
+        self.assertEqual(self.land_count(APIClient()), 0)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {issue_tokens(self.seller)['access']}")
+        self.assertEqual(self.land_count(client), 0)
+        response = client.post(reverse('land-list'), {
+            'title': 'Shamba', 'description': 'd', 'size': '2.00', 'location': 'Arusha', 'price': '10.00',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Pinned to the primary by the cookie, and by token for clients without cookies.
+        self.assertEqual(self.land_count(client), 2)
+        client.cookies.clear()
+        self.assertEqual(self.land_count(client), 2)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        with mock.patch.object(connections['replica'], 'ensure_connection', side_effect=OperationalError):
+            self.assertEqual(self.land_count(APIClient()), 1)
+        # Stays out of rotation for REPLICA_RETRY_SECONDS.
+        self.assertEqual(self.land_count(APIClient()), 1)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_dead_open_connection_is_detected(self):
+        connections['replica'].ensure_connection()
+        with mock.patch.object(connections['replica'], 'is_usable', return_value=False), \
+                mock.patch.object(connections['replica'], 'get_new_connection', side_effect=OperationalError):
+            self.assertEqual(self.land_count(APIClient()), 1)
+        self.assertIn('replica', replicas._down_until)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_replica_is_chosen_once_per_request(self):
+        with mock.patch.object(replicas, 'pick_replica', wraps=replicas.pick_replica) as pick:
+            self.assertEqual(self.land_count(APIClient()), 0)
+        self.assertEqual(pick.call_count, 1)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_replica_failing_mid_request_is_retried_on_primary(self):
+        client = APIClient(raise_request_exception=False)
+        with mock.patch.object(connections['replica'], 'cursor', side_effect=OperationalError), \
+                self.assertLogs('django.request', 'ERROR'):
+            self.assertEqual(len(client.get(reverse('land-list')).json()), 1)
+        self.assertIn('replica', replicas._down_until)
+
+
+class SavedSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = make_user()
+        self.buyer = make_user('buyer')
+        self.grain = Category.objects.create(name='nafaka')
+        self.client.force_authenticate(self.buyer)
+
+    def save_search(self, **data):
+        response = self.client.post(reverse('saved-search-list'), data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return SavedSearch.objects.get(pk=response.data['id'])
+
+    def match(self):
+        return SearchAlert.match_new_listings(lag=timedelta(0))
+
+    def test_new_listings_queue_alerts_for_matching_searches(self):
+        make_listing(Land, self.seller, n=99)
+        self.match()  # First run only sets the checkpoint
+
+        maize = self.save_search(kind='products', keywords='white maize', max_price='100')
+        grain = self.save_search(kind='products', category=self.grain.pk)
+        land = self.save_search(kind='lands', location='morogoro', min_price='500')
+        self.assertEqual((maize.anchor, grain.anchor, land.anchor), ('kw:maize', f'cat:{self.grain.pk}', 'loc:morogoro'))
+
+        hit = Product.objects.create(user=self.seller, category=self.grain, name='White maize',
+                                     description='dry', price=Decimal('90.00'), quantity=3)
+        Product.objects.create(user=self.seller, category=self.grain, name='Maize flour',
+                               description='white, sifted', price=Decimal('500.00'), quantity=3)
+        shamba = make_listing(Land, self.seller)
+        make_listing(Land, self.buyer, n=1)  # The buyer's own listing never alerts them
+
+        # Per kind: checkpoint, new rows, candidate searches, and the write
+        # (insert + checkpoint update in a savepoint); no per-search queries.
+        with self.assertNumQueries(14):
+            self.assertEqual(self.match(), 4)
+        self.assertEqual(
+            set(SearchAlert.objects.values_list('saved_search', 'kind', 'listing_id')),
+            {(maize.pk, 'products', hit.pk), (grain.pk, 'products', hit.pk),
+             (grain.pk, 'products', hit.pk + 1), (land.pk, 'lands', shamba.pk)},
+        )
+        self.assertEqual(self.match(), 0)
+
+        response = self.client.get(reverse('user-alerts'), {'unseen': 1})
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(self.client.post(reverse('user-alerts')).data, {'seen': 4})
+        self.assertEqual(self.client.get(reverse('user-alerts'), {'unseen': 1}).data, [])
+
+    def test_rejects_fields_the_kind_does_not_have(self):
+        response = self.client.post(reverse('saved-search-list'), {'kind': 'lands', 'category': self.grain.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        search = self.save_search(kind='products', min_price='10')
+        self.assertEqual(search.anchor, '*')
+        self.assertEqual(self.client.delete(reverse('saved-search-detail', args=[search.pk])).status_code, 204)
+
+
+class MultiGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())  # Keeps the response cache out of the way
+        category = Category.objects.create(name='nafaka')
+        self.products = [make_listing(Product, User.objects.get(), category, n) for n in range(3)]
+
+    def test_returns_requested_order_and_reports_missing(self):
+        first, second, third = (product.pk for product in self.products)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product-list'), {'ids': f'{third},{first},{third}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [third, first])
+        self.assertEqual(response.data['results'][0]['category']['name'], 'nafaka')
+
+        # Ids not in the table cost one archive lookup.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('product-list'), {'ids': f'{first},999'})
+        self.assertEqual(response.data['missing'], [999])
+
+    def test_reports_archived_listings_separately(self):
+        first, second, third = (product.pk for product in self.products)
+        ArchivedListing.archive(Product.objects.filter(pk=second))
+        response = self.client.get(reverse('product-list'), {'ids': f'{first},{second},999'})
+        self.assertEqual([row['id'] for row in response.data['results']], [first])
+        self.assertEqual(response.data['archived'], [second])
+        self.assertEqual(response.data['missing'], [999])
+
+    def test_rejects_bad_and_oversized_id_lists(self):
+        url = reverse('land-list')
+        self.assertEqual(self.client.get(url, {'ids': '1,x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': ','.join(map(str, range(1, 102)))}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': '1'}).data, {'results': [], 'archived': [], 'missing': [1]})
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = make_user('staff', is_staff=True)
+        self.client.force_authenticate(self.staff)
+        make_listing(Land, self.staff)
+
+    def test_signed_header_profiles_request(self):
+        response = self.client.get(reverse('land-list'), HTTP_X_PROFILE=make_token(self.staff))
+        self.assertEqual(response.status_code, 200)
+        report = ProfileReport.objects.get(pk=response['X-Profile-Report'])
+        self.assertEqual((report.user, report.path, report.status_code), (self.staff, '/api/land/', 200))
+        self.assertIn('function calls', report.profile)
+        self.assertEqual(report.query_count, len(report.queries))
+        listing_query = next(query for query in report.queries if 'core_land' in query['sql'])
+        self.assertTrue(listing_query['explain'])
+
+        admin = APIClient()
+        self.staff.is_superuser = True
+        self.staff.save()
+        admin.force_login(self.staff)
+        page = admin.get(reverse('admin:core_profilereport_change', args=[report.pk]))
+        self.assertContains(page, 'core_land')
+
+    def test_requests_without_valid_staff_token_are_not_profiled(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('land-list'))
+        self.client.get(reverse('land-list'), HTTP_X_PROFILE='forged')
+        regular = make_user('regular')
+        self.client.get(reverse('land-list'), HTTP_X_PROFILE=make_token(regular))
+        self.assertFalse(ProfileReport.objects.exists())
+
+
+class RegistrationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def register(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('register'), {
+                'username': 'mkulima', 'email': 'mkulima@example.com', 'password': 'pass12345',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len([sql for sql in writes if 'core_user' in sql]), 1)
+        return User.objects.get(username='mkulima')
+
+    def verify(self, code):
+        return self.client.post(reverse('verify-email'), {'email': 'mkulima@example.com', 'code': code}, format='json')
+
+    def emailed_code(self):
+        return next(word for word in mail.outbox[-1].body.split() if word.isdigit() and len(word) == 6)
+
+    def test_register_writes_user_once_and_stores_only_a_hash(self):
+        user = self.register()
+        self.assertFalse(user.is_active)
+        code = self.emailed_code()
+        stored = EmailVerificationCode.objects.get(user=user)
+        self.assertNotIn(code, stored.code_hash)
+
+        self.assertEqual(self.verify('000000' if code != '000000' else '111111').status_code, 400)
+        self.assertEqual(self.verify(code).status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.is_active and user.is_email_verified)
+        self.assertFalse(EmailVerificationCode.objects.exists())
+
+    def test_codes_expire_and_lock_after_too_many_attempts(self):
+        user = self.register()
+        code = self.emailed_code()
+        wrong = '000000' if code != '000000' else '111111'
+        for _ in range(settings.VERIFICATION_CODE_MAX_ATTEMPTS):
+            self.verify(wrong)
+        response = self.verify(code)
+        self.assertEqual(response.data['error'], 'Too many wrong attempts; request a new code')
+
+        self.client.post(reverse('resend-verification'), {'email': user.email}, format='json')
+        EmailVerificationCode.objects.update(expires_at=timezone.now())
+        self.assertIn('expired', self.verify(self.emailed_code()).data['error'])
+        call_command('purge_verification_codes', stdout=open('/dev/null', 'w'))
+        self.assertFalse(EmailVerificationCode.objects.exists())
+
+
+class ConcurrentVerificationTests(TransactionTestCase):
+    def test_parallel_guesses_respect_the_attempt_limit(self):
+        user = make_user(is_active=False)
+        EmailVerificationCode.issue(user)
+        limit = settings.VERIFICATION_CODE_MAX_ATTEMPTS
+        compared, results = [], []
+        hash_code = EmailVerificationCode.hash_code
+        start = threading.Barrier(limit + 5)
+
+        def counted(user_id, code):
+            compared.append(code)
+            return hash_code(user_id, code)
+
+        def guess(n):
+            try:
+                start.wait()
+                results.append(EmailVerificationCode.verify(user, f'{n:06d}x'))
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(EmailVerificationCode, 'hash_code', side_effect=counted):
+            threads = [threading.Thread(target=guess, args=[n]) for n in range(limit + 5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(compared), limit)
+        self.assertEqual(sorted(results), sorted([EmailVerificationCode.INVALID] * limit +
+                                                 [EmailVerificationCode.LOCKED] * 5))
+
+
+class OptimisticConcurrencyTests(TestCase):
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.client = APIClient()
+        self.seller = make_user()
+        self.land = make_listing(Land, self.seller)
+        self.url = reverse('land-detail', args=[self.land.pk])
+        self.client.force_authenticate(self.seller)
+
+    def put(self, data, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(self.url, data, format='json', **headers)
+        return response, [query['sql'] for query in queries if query['sql'].startswith('UPDATE "core_land"')]
+
+    def test_if_match_detects_concurrent_edits(self):
+        etag = APIClient().get(self.url)['ETag']
+        self.assertEqual(etag, '"1"')
+        self.assertEqual(APIClient().get(self.url)['ETag'], etag)  # Kept on cache hits
+
+        response, updates = self.put({'price': '1200.00'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"2"')
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"price"', updates[0])
+        self.assertNotIn('"description"', updates[0])
+
+        response, updates = self.put({'price': '900.00'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.data['version'], 2)
+        self.assertEqual(updates, [])
+        self.land.refresh_from_db()
+        self.assertEqual((self.land.price, self.land.version), (Decimal('1200.00'), 2))
+
+    def test_unchanged_update_skips_write(self):
+        response, updates = self.put({'price': '1000.00', 'location': 'Morogoro'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(updates, [])
+        self.assertEqual(response.data['version'], 1)
+
+    def test_ownership_checked_before_validation(self):
+        self.client.force_authenticate(make_user('other'))
+        response, updates = self.put({'price': 'not a number'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(updates, [])
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(UPLOAD_TEMP_DIR=os.path.join(directory, 'parts'),
+                                        MEDIA_ROOT=os.path.join(directory, 'media'), UPLOAD_CHUNK_MAX_SIZE=100))
+        self.client = APIClient()
+        self.seller = make_user()
+        self.client.force_authenticate(self.seller)
+        self.product = make_listing(Product, self.seller, Category.objects.create(name='nafaka'))
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.frombytes('L', (32, 32), os.urandom(1024)).save(buffer, 'PNG')
+        self.image = buffer.getvalue()
+
+    def open(self, **data):
+        response = self.client.post(reverse('upload-list'), {'filename': 'maize.png', 'size': len(self.image), **data},
+                                    format='json')
+        return response, reverse('upload-detail', args=[response.data.get('id')]) if response.status_code == 201 else None
+
+    def send(self, url, offset, chunk):
+        return self.client.put(url, chunk, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_resumes_and_attaches_to_listing(self):
+        response, url = self.open()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['offset'], response.data['chunk_size']), (0, 100))
+        upload = ChunkedUpload.objects.get()
+
+        self.assertEqual(self.send(url, 0, self.image[:60]).data['offset'], 60)
+        # A retried chunk, or one sent past the gap, is refused with the offset to resume from.
+        response = self.send(url, 0, self.image[:60])
+        self.assertEqual((response.status_code, response['Upload-Offset']), (409, '60'))
+        self.assertEqual(self.send(url, 100, self.image[100:160]).status_code, 409)
+        self.assertEqual(self.send(url, 60, self.image[60:]).status_code, 413)
+        attach = reverse('upload-attach', args=[upload.pk])
+        self.assertEqual(self.client.post(attach, {'kind': 'products', 'id': self.product.pk}).status_code, 409)
+
+        for offset in range(60, len(self.image), 100):
+            response = self.send(url, offset, self.image[offset:offset + 100])
+        self.assertTrue(response.data['complete'])
+        self.assertEqual(self.client.get(url)['Upload-Offset'], str(len(self.image)))
+
+        response = self.client.post(attach, {'kind': 'products', 'id': self.product.pk}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], 2)
+        self.product.refresh_from_db()
+        with self.product.image.open('rb') as image:
+            self.assertEqual(image.read(), self.image)
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertFalse(os.path.exists(upload.path))
+
+    def test_rejects_bad_uploads(self):
+        self.assertEqual(self.open(filename='notes.exe')[0].status_code, 400)
+        self.assertEqual(self.open(size=10 ** 9)[0].status_code, 400)
+
+        response, url = self.open(size=5)
+        # Without a Content-Length (chunked transfer) the size can't be checked up front.
+        response = self.client.put(url, b'hello', content_type='application/octet-stream',
+                                   HTTP_UPLOAD_OFFSET='0', CONTENT_LENGTH='')
+        self.assertEqual(response.status_code, 411)
+        self.send(url, 0, b'hello')
+        upload = ChunkedUpload.objects.get()
+        attach = reverse('upload-attach', args=[upload.pk])
+        response = self.client.post(attach, {'kind': 'products', 'id': self.product.pk})
+        self.assertEqual(response.status_code, 400)  # Not an image, so discarded
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+        self.client.force_authenticate(make_user('stranger'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_racing_writers_cannot_overwrite_each_other(self):
+        self.open()
+        upload = ChunkedUpload.objects.get()
+        stale = ChunkedUpload.objects.get()  # As loaded by a second request at the same time
+        outcome = []
+
+        class Stream(io.BytesIO):
+            # Sends the racing request while the first is partway through its chunk.
+            def read(self, size=-1):
+                if not outcome:
+                    try:
+                        uploads.write_chunk(stale, 0, io.BytesIO(b'B' * 60), 60)
+                    except uploads.ChunkError as e:
+                        outcome.append(e.status)
+                return super().read(size)
+
+        uploads.write_chunk(upload, 0, Stream(self.image[:60]), 60)
+        self.assertEqual(outcome, [409])
+        # A retry of the same range after the first request finished is refused too.
+        with self.assertRaises(uploads.ChunkError):
+            uploads.write_chunk(stale, 0, io.BytesIO(b'B' * 60), 60)
+        with open(upload.path, 'rb') as part:
+            self.assertEqual(part.read(), self.image[:60])
+        self.assertEqual(ChunkedUpload.objects.get().offset, 60)
+
+    def upload_image(self):
+        url = self.open()[1]
+        for offset in range(0, len(self.image), 100):
+            self.send(url, offset, self.image[offset:offset + 100])
+        return reverse('upload-attach', args=[ChunkedUpload.objects.get().pk])
+
+    def test_attaching_to_another_users_listing_keeps_the_upload(self):
+        attach = self.upload_image()
+        other = make_listing(Product, make_user('other'), self.product.category, n=1)
+        response = self.client.post(attach, {'kind': 'products', 'id': other.pk})
+        self.assertEqual(response.status_code, 403)
+        upload = ChunkedUpload.objects.get()
+        self.assertTrue(os.path.exists(upload.path))
+        self.assertEqual(self.client.post(attach, {'kind': 'products', 'id': self.product.pk}).status_code, 200)
+
+    def test_upload_attaches_only_once(self):
+        attach = self.upload_image()
+        self.assertEqual(self.client.post(attach, {'kind': 'products', 'id': self.product.pk}).status_code, 200)
+        # A second attach (e.g. a retry racing the first) finds the upload gone.
+        self.assertEqual(self.client.post(attach, {'kind': 'products', 'id': self.product.pk}).status_code, 404)
+
+    def test_expired_uploads_do_not_count_towards_the_limit(self):
+        for _ in range(ChunkedUpload.MAX_OPEN_PER_USER):
+            self.open()
+        self.assertEqual(self.open()[0].status_code, 400)
+        ChunkedUpload.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.open()[0].status_code, 201)
+
+    def test_purge_removes_abandoned_uploads(self):
+        kept = self.open()[1]
+        self.open()
+        ChunkedUpload.objects.exclude(pk=kept.split('/')[-2]).update(expires_at=timezone.now())
+        stray = os.path.join(settings.UPLOAD_TEMP_DIR, 'f' * 32 + '.part')
+        open(stray, 'wb').close()
+        os.utime(stray, (0, 0))
+
+        call_command('purge_uploads', stdout=io.StringIO())
+        upload = ChunkedUpload.objects.get()
+        self.assertEqual(sorted(os.listdir(settings.UPLOAD_TEMP_DIR)), [f'{upload.pk.hex}.part'])
@@ -0,0 +1,116 @@
+# core/uploads.py
+"""Resumable chunked uploads of listing images.
+
+1. ``POST /api/uploads/`` with ``filename`` and ``size`` opens a ChunkedUpload.
+2. ``PUT /api/uploads/<id>/`` sends the next chunk (at most the
+   ``chunk_size`` from step 1) as the raw request body, with its position
+   in the ``Upload-Offset`` header and a ``Content-Length``. Chunks are
+   copied to disk as they arrive, never held in memory whole.
+3. ``GET /api/uploads/<id>/`` reports the committed offset, which is where
+   a client resumes after a dropped connection.
+4. ``POST /api/uploads/<id>/attach/`` with ``kind`` and ``id`` makes the
+   finished file that listing's image.
+
+Each request carries at most UPLOAD_CHUNK_MAX_SIZE bytes, so a slow link
+holds a worker for one chunk rather than the whole photo.
+"""
+import fcntl
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .models import ChunkedUpload
+
+OFFSET_HEADER = 'HTTP_UPLOAD_OFFSET'
+COPY_BLOCK = 64 * 1024
+
+
+class ChunkError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def open_upload(user, filename, size):
+    upload = ChunkedUpload.objects.create(
+        user=user, filename=filename, size=size,
+        expires_at=timezone.now() + settings.UPLOAD_SESSION_TTL,
+    )
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    open(upload.path, 'xb').close()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length):
+    """Copy ``length`` bytes from ``stream`` to the upload at ``offset``.
+
+    Writers take an exclusive lock on the part file and check the committed
+    offset under it, so a stale or concurrent request never touches bytes
+    another one already committed. The offset only moves once every byte is
+    on disk. Otherwise ChunkError says why.
+
+    The lock is on the file rather than the ChunkedUpload row so that a
+    slow client doesn't hold a database transaction open while it sends.
+    """
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+        raise ChunkError(f'Chunks may be at most {settings.UPLOAD_CHUNK_MAX_SIZE} bytes', 413)
+    if offset + length > upload.size:
+        raise ChunkError('Chunk runs past the declared size', 400)
+
+    with open(upload.path, 'r+b') as part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ChunkError('Another request is writing to this upload', 409)
+        upload.refresh_from_db(fields=['offset'])
+        if offset != upload.offset:
+            raise ChunkError('Upload-Offset does not match the upload', 409)
+
+        written = 0
+        part.seek(offset)
+        while written < length:
+            block = stream.read(min(COPY_BLOCK, length - written))
+            if not block:
+                break
+            part.write(block)
+            written += len(block)
+        if written < length:
+            # The connection dropped mid-chunk; the client resends from `offset`.
+            raise ChunkError('Chunk was shorter than its Content-Length', 400)
+        part.flush()
+
+        ChunkedUpload.objects.filter(pk=upload.pk, offset=offset).update(
+            offset=offset + length, expires_at=timezone.now() + settings.UPLOAD_SESSION_TTL,
+        )
+    upload.refresh_from_db(fields=['offset', 'expires_at'])
+    return upload
+
+
+def is_image(path):
+    from PIL import Image  # Deferred so workers start without PIL; see core.startup
+
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        return False
+    return True
+
+
+class PartFile(File):
+    # FileSystemStorage moves files that have a temporary path instead of
+    # copying them.
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def attach(upload, listing):
+    """Make the finished upload ``listing``'s image and drop the upload."""
+    with open(upload.path, 'rb') as part:
+        listing.image.save(os.path.basename(upload.filename), PartFile(part), save=False)
+    listing.version += 1
+    listing.save(update_fields=['image', 'version', 'updated_at'])
+    upload.discard()
+    return listing
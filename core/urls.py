@@ -8,8 +8,13 @@ from .views import (
     ServiceList, ServiceDetail,
     VideoList, VideoDetail,
     VideoYouTubeSearch,
-    RegisterView, VerifyEmailView, LoginView, LogoutView, UserDetail,
-    ResendVerificationView,CsrfTokenView
+    ProductSimilar, LandSimilar, ServiceSimilar, Autocomplete,
+    ProductPriceHistory, LandPriceHistory,
+    SavedSearchList, SavedSearchDetail, UserAlerts,
+    UploadList, UploadDetail, UploadAttach,
+    OrderList, OrderDetail, OrderConfirm, OrderCancel,
+    RegisterView, VerifyEmailView, LoginView, LogoutView, UserDetail, UserDashboard,
+    ResendVerificationView,CsrfTokenView, TokenRefreshView
 )
 
 urlpatterns = [
@@ -17,20 +22,38 @@ urlpatterns = [
     path('api/verify-email/', VerifyEmailView.as_view(), name='verify-email'),
     path('api/login/', LoginView.as_view(), name='login'),
     path('api/get-csrf/', CsrfTokenView.as_view(), name='get-csrf'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('api/logout/', LogoutView.as_view(), name='logout'),
     path('api/resend-verification/', ResendVerificationView.as_view(), name='resend-verification'),
     path('api/user/', UserDetail.as_view(), name='user-detail'),
+    path('api/user/dashboard/', UserDashboard.as_view(), name='user-dashboard'),
+    path('api/user/alerts/', UserAlerts.as_view(), name='user-alerts'),
+    path('api/saved-searches/', SavedSearchList.as_view(), name='saved-search-list'),
+    path('api/saved-searches/<int:pk>/', SavedSearchDetail.as_view(), name='saved-search-detail'),
+    path('api/autocomplete/', Autocomplete.as_view(), name='autocomplete'),
     path('api/categories/', CategoryList.as_view(), name='category-list'),
     path('api/categories/<int:pk>/', CategoryDetail.as_view(), name='category-detail'),
     path('api/products/', ProductList.as_view(), name='product-list'),
     path('api/products/<int:pk>/', ProductDetail.as_view(), name='product-detail'),
+    path('api/products/<int:pk>/similar/', ProductSimilar.as_view(), name='product-similar'),
+    path('api/products/<int:pk>/price-history/', ProductPriceHistory.as_view(), name='product-price-history'),
     path('api/land/', LandList.as_view(), name='land-list'),
     path('api/land/<int:pk>/', LandDetail.as_view(), name='land-detail'),
+    path('api/land/<int:pk>/similar/', LandSimilar.as_view(), name='land-similar'),
+    path('api/land/<int:pk>/price-history/', LandPriceHistory.as_view(), name='land-price-history'),
     path('api/inputs/', InputList.as_view(), name='input-list'),
     path('api/inputs/<int:pk>/', InputDetail.as_view(), name='input-detail'),
     path('api/services/', ServiceList.as_view(), name='service-list'),
     path('api/services/<int:pk>/', ServiceDetail.as_view(), name='service-detail'),
+    path('api/services/<int:pk>/similar/', ServiceSimilar.as_view(), name='service-similar'),
     path('api/videos/', VideoList.as_view(), name='video-list'),
     path('api/videos/<int:pk>/', VideoDetail.as_view(), name='video-detail'),
+    path('api/uploads/', UploadList.as_view(), name='upload-list'),
+    path('api/uploads/<uuid:pk>/', UploadDetail.as_view(), name='upload-detail'),
+    path('api/uploads/<uuid:pk>/attach/', UploadAttach.as_view(), name='upload-attach'),
+    path('api/orders/', OrderList.as_view(), name='order-list'),
+    path('api/orders/<int:pk>/', OrderDetail.as_view(), name='order-detail'),
+    path('api/orders/<int:pk>/confirm/', OrderConfirm.as_view(), name='order-confirm'),
+    path('api/orders/<int:pk>/cancel/', OrderCancel.as_view(), name='order-cancel'),
     path('api/videos/youtube_search/', VideoYouTubeSearch.as_view(), name='video-youtube-search'),
 ]
\ No newline at end of file
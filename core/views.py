@@ -2,32 +2,148 @@
 from django.contrib.auth import authenticate, login, logout
 from django.core.mail import send_mail
 from django.conf import settings
+from django.middleware.csrf import get_token
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
+from django.utils import timezone
 from django.utils.html import strip_tags
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
-from .models import User, Category, Product, Land, Input, Service, Video
+from .models import (
+    User, Category, Product, Land, Input, Service, Video, Order, OutOfStock, SellerStats,
+    PricePoint, PriceRollup, ArchivedListing, SavedSearch, SearchAlert, EmailVerificationCode,
+    ChunkedUpload,
+)
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView as BaseTokenRefreshView
+from . import autocomplete, uploads
+from .authentication import issue_tokens
+from .idempotency import idempotent
+from .response_cache import cache_response
+from .models import RevokedToken
 from .serializers import (
-    RegisterSerializer, VerifyEmailSerializer, UserSerializer,
+    RegisterSerializer, VerifyEmailSerializer, UserSerializer, TokenRefreshSerializer,
     CategorySerializer, ProductSerializer, LandSerializer,
-    InputSerializer, ServiceSerializer, VideoSerializer
+    InputSerializer, ServiceSerializer, VideoSerializer,
+    OrderSerializer, OrderCreateSerializer, SellerDashboardSerializer,
+    PriceHistoryQuerySerializer, PriceHistorySerializer, SavedSearchSerializer, SearchAlertSerializer,
+    ChunkedUploadSerializer, UploadAttachSerializer,
+    product_rows, land_rows, input_rows, service_rows, video_rows
 )
 import logging
-import requests
 
 logger = logging.getLogger(__name__)
 
+MAX_MULTI_GET_IDS = 100
+
+VERIFICATION_ERRORS = {
+    EmailVerificationCode.INVALID: 'Invalid verification code',
+    EmailVerificationCode.EXPIRED: 'Verification code has expired; request a new one',
+    EmailVerificationCode.LOCKED: 'Too many wrong attempts; request a new code',
+    EmailVerificationCode.MISSING: 'No verification code exists for this user',
+}
+
+def wants_token_auth(request):
+    return request.data.get('auth_mode') == 'token'
+
+def get_listing(model, pk):
+    """Return ``(listing, archived)``, falling back to the archive; 404 if neither has it."""
+    listing = model.objects.filter(pk=pk).first()
+    if listing is not None:
+        return listing, False
+    archived = get_object_or_404(ArchivedListing, kind=ArchivedListing.kind_for(model), listing_id=pk)
+    return archived.as_instance(), True
+
+def multi_get(request, model, rows):
+    """Serve ``?ids=1,2,3`` on a list endpoint with a single ``IN`` query.
+
+    Results come back in the requested order. Ids of archived listings are
+    reported under ``archived`` (their detail URLs still serve them) and
+    ids with no listing at all under ``missing``.
+    """
+    try:
+        ids = list(dict.fromkeys(int(part) for part in request.query_params['ids'].split(',') if part.strip()))
+    except ValueError:
+        return Response({'error': 'ids must be a comma-separated list of integers'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not ids or len(ids) > MAX_MULTI_GET_IDS:
+        return Response({'error': f'Pass between 1 and {MAX_MULTI_GET_IDS} ids'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    found = {row['id']: row for row in rows.serialize(model.objects.filter(pk__in=ids))}
+    absent = [pk for pk in ids if pk not in found]
+    kind = ArchivedListing.kind_for(model)
+    archived = set()
+    if absent and kind is not None:
+        archived = set(ArchivedListing.objects.filter(kind=kind, listing_id__in=absent)
+                       .values_list('listing_id', flat=True))
+    return Response({
+        'results': [found[pk] for pk in ids if pk in found],
+        'archived': [pk for pk in absent if pk in archived],
+        'missing': [pk for pk in absent if pk not in archived],
+    })
+
+def etag(listing):
+    return f'"{listing.version}"'
+
+def if_match(request, listing):
+    """True unless the request's If-Match names a version other than the listing's."""
+    header = request.META.get('HTTP_IF_MATCH')
+    if header is None or header.strip() == '*':
+        return True
+    tags = {tag.strip().removeprefix('W/').strip('"') for tag in header.split(',')}
+    return str(listing.version) in tags
+
+def update_listing(request, model, serializer_class, pk, noun):
+    """Partially update a listing the caller owns.
+
+    Ownership and If-Match are checked before any validation. Only the
+    columns whose values actually change are written, and nothing at all
+    when none do. The row is locked from the version check to the write.
+    """
+    with transaction.atomic():
+        listing = get_object_or_404(model.objects.select_for_update(), pk=pk)
+        if listing.user_id != request.user.pk:
+            return Response({'error': f'You do not have permission to update this {noun}'},
+                            status=status.HTTP_403_FORBIDDEN)
+        if not if_match(request, listing):
+            return Response({'error': f'This {noun} has been changed since you loaded it', 'version': listing.version},
+                            status=status.HTTP_412_PRECONDITION_FAILED, headers={'ETag': etag(listing)})
+        serializer = serializer_class(listing, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        changed = [name for name, value in serializer.validated_data.items() if getattr(listing, name) != value]
+        if changed:
+            for name in changed:
+                setattr(listing, name, serializer.validated_data[name])
+            listing.version += 1
+            listing.save(update_fields=[*changed, 'version', 'updated_at'])
+    return Response(serializer_class(listing).data, headers={'ETag': etag(listing)})
+
+def auth_response(request, user, message):
+    """Start a session, or issue JWTs when the client asked for token auth."""
+    data = {
+        'message': message,
+        'user': UserSerializer(user).data
+    }
+    if wants_token_auth(request):
+        data['tokens'] = issue_tokens(user)
+    else:
+        login(request, user)
+    return Response(data, status=status.HTTP_200_OK)
+
 class RegisterView(APIView):
+    @idempotent
     def post(self, request):
-        logger.debug(f"Register request received: {request.data}")
+        logger.debug("Register request received: %s", request.data)
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            user.is_active = False  # User can't login until email is verified
-            verification_code = user.generate_verification_code()
+            verification_code = serializer.verification_code
             
             # Prepare email content
             subject = 'Verify Your KilimoPesa Account'
@@ -66,7 +182,7 @@ class RegisterView(APIView):
 
 class VerifyEmailView(APIView):
     def post(self, request):
-        logger.debug(f"Verify email request received: {request.data}")
+        logger.debug("Verify email request received: %s", request.data)
         serializer = VerifyEmailSerializer(data=request.data)
         if serializer.is_valid():
             email = serializer.validated_data['email']
@@ -81,28 +197,17 @@ class VerifyEmailView(APIView):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                if not user.verification_code:
-                    return Response(
-                        {'error': 'No verification code exists for this user'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-                if user.verification_code == code:
-                    user.is_email_verified = True
-                    user.is_active = True
-                    user.verification_code = None
-                    user.save()
+                result = EmailVerificationCode.verify(user, code)
+                if result == EmailVerificationCode.OK:
+                    User.objects.filter(pk=user.pk).update(is_email_verified=True, is_active=True)
+                    user.is_email_verified = user.is_active = True
                     
-                    login(request, user)
                     logger.info(f"Email verified for {user.email}")
-                    return Response({
-                        'message': 'Email verified successfully',
-                        'user': UserSerializer(user).data
-                    }, status=status.HTTP_200_OK)
+                    return auth_response(request, user, 'Email verified successfully')
                 
-                logger.error(f"Invalid verification code for {email}")
+                logger.error(f"Verification failed for {email}: {result}")
                 return Response(
-                    {'error': 'Invalid verification code'},
+                    {'error': VERIFICATION_ERRORS[result]},
                     status=status.HTTP_400_BAD_REQUEST
                 )
                 
@@ -118,7 +223,7 @@ class VerifyEmailView(APIView):
 
 class LoginView(APIView):
     def post(self, request):
-        logger.debug(f"Login request received: {request.data}")
+        logger.debug("Login request received: %s", request.data)
         email = request.data.get('email')
         password = request.data.get('password')
         
@@ -145,26 +250,36 @@ class LoginView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        login(request, user)
         logger.info(f"Login successful for {email}")
-        return Response({
-            'message': 'Login successful',
-            'user': UserSerializer(user).data
-        }, status=status.HTTP_200_OK)
+        return auth_response(request, user, 'Login successful')
 
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
-        logger.info(f"Logout request for {request.user.email}")
+        logger.info(f"Logout request for user {request.user.pk}")
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                token = RefreshToken(refresh)
+            except TokenError:
+                token = None
+            if token is not None:
+                if str(token.get(api_settings.USER_ID_CLAIM)) != str(request.user.pk):
+                    return Response({'error': 'This refresh token belongs to another user'},
+                                    status=status.HTTP_403_FORBIDDEN)
+                RevokedToken.revoke(token)
         logout(request)
         return Response({
             'message': 'Logged out successfully'
         }, status=status.HTTP_200_OK)
 
+class TokenRefreshView(BaseTokenRefreshView):
+    serializer_class = TokenRefreshSerializer
+
 class ResendVerificationView(APIView):
     def post(self, request):
-        logger.debug(f"Resend verification request: {request.data}")
+        logger.debug("Resend verification request: %s", request.data)
         email = request.data.get('email')
         if not email:
             logger.error("Email missing for resend verification")
@@ -183,7 +298,7 @@ class ResendVerificationView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
                 
-            verification_code = user.generate_verification_code()
+            verification_code = EmailVerificationCode.issue(user)
             
             subject = 'Your New Verification Code'
             html_message = render_to_string('email/verification_email.html', {
@@ -220,14 +335,29 @@ class UserDetail(APIView):
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
 
+class UserDashboard(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            stats = SellerStats.objects.get(user_id=request.user.pk)
+        except SellerStats.DoesNotExist:
+            # First visit for sellers whose listings predate the counters.
+            stats = SellerStats.refresh(request.user.pk)
+        serializer = SellerDashboardSerializer(stats)
+        return Response(serializer.data)
+
 class ProductList(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @cache_response(Product, Category, User)
     def get(self, request):
+        if 'ids' in request.query_params:
+            return multi_get(request, Product, product_rows)
         products = Product.objects.all()
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        return Response(product_rows.serialize(products))
 
+    @idempotent
     def post(self, request):
         serializer = ProductSerializer(data=request.data)
         if serializer.is_valid():
@@ -241,21 +371,16 @@ class ProductDetail(APIView):
     def get_object(self, pk):
         return get_object_or_404(Product, pk=pk)
 
+    @cache_response(Product, Category, User)
     def get(self, request, pk):
-        product = self.get_object(pk)
+        product, archived = get_listing(Product, pk)
         serializer = ProductSerializer(product)
-        return Response(serializer.data)
+        if archived:
+            return Response({**serializer.data, 'archived': True})
+        return Response(serializer.data, headers={'ETag': etag(product)})
 
     def put(self, request, pk):
-        product = self.get_object(pk)
-        serializer = ProductSerializer(product, data=request.data, partial=True)
-        if serializer.is_valid():
-            if product.user != request.user:
-                return Response({'error': 'You do not have permission to update this product'}, 
-                              status=status.HTTP_403_FORBIDDEN)
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return update_listing(request, Product, ProductSerializer, pk, 'product')
 
     def delete(self, request, pk):
         product = self.get_object(pk)
@@ -268,11 +393,14 @@ class ProductDetail(APIView):
 class LandList(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @cache_response(Land, User)
     def get(self, request):
+        if 'ids' in request.query_params:
+            return multi_get(request, Land, land_rows)
         lands = Land.objects.all()
-        serializer = LandSerializer(lands, many=True)
-        return Response(serializer.data)
+        return Response(land_rows.serialize(lands))
 
+    @idempotent
     def post(self, request):
         serializer = LandSerializer(data=request.data)
         if serializer.is_valid():
@@ -286,21 +414,16 @@ class LandDetail(APIView):
     def get_object(self, pk):
         return get_object_or_404(Land, pk=pk)
 
+    @cache_response(Land, User)
     def get(self, request, pk):
-        land = self.get_object(pk)
+        land, archived = get_listing(Land, pk)
         serializer = LandSerializer(land)
-        return Response(serializer.data)
+        if archived:
+            return Response({**serializer.data, 'archived': True})
+        return Response(serializer.data, headers={'ETag': etag(land)})
 
     def put(self, request, pk):
-        land = self.get_object(pk)
-        serializer = LandSerializer(land, data=request.data, partial=True)
-        if serializer.is_valid():
-            if land.user != request.user:
-                return Response({'error': 'You do not have permission to update this land'}, 
-                              status=status.HTTP_403_FORBIDDEN)
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return update_listing(request, Land, LandSerializer, pk, 'land')
 
     def delete(self, request, pk):
         land = self.get_object(pk)
@@ -313,11 +436,14 @@ class LandDetail(APIView):
 class InputList(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @cache_response(Input, User)
     def get(self, request):
+        if 'ids' in request.query_params:
+            return multi_get(request, Input, input_rows)
         inputs = Input.objects.all()
-        serializer = InputSerializer(inputs, many=True)
-        return Response(serializer.data)
+        return Response(input_rows.serialize(inputs))
 
+    @idempotent
     def post(self, request):
         serializer = InputSerializer(data=request.data)
         if serializer.is_valid():
@@ -331,21 +457,16 @@ class InputDetail(APIView):
     def get_object(self, pk):
         return get_object_or_404(Input, pk=pk)
 
+    @cache_response(Input, User)
     def get(self, request, pk):
-        input_item = self.get_object(pk)
+        input_item, archived = get_listing(Input, pk)
         serializer = InputSerializer(input_item)
-        return Response(serializer.data)
+        if archived:
+            return Response({**serializer.data, 'archived': True})
+        return Response(serializer.data, headers={'ETag': etag(input_item)})
 
     def put(self, request, pk):
-        input_item = self.get_object(pk)
-        serializer = InputSerializer(input_item, data=request.data, partial=True)
-        if serializer.is_valid():
-            if input_item.user != request.user:
-                return Response({'error': 'You do not have permission to update this input'}, 
-                              status=status.HTTP_403_FORBIDDEN)
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return update_listing(request, Input, InputSerializer, pk, 'input')
 
     def delete(self, request, pk):
         input_item = self.get_object(pk)
@@ -358,11 +479,14 @@ class InputDetail(APIView):
 class ServiceList(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @cache_response(Service, User)
     def get(self, request):
+        if 'ids' in request.query_params:
+            return multi_get(request, Service, service_rows)
         services = Service.objects.all()
-        serializer = ServiceSerializer(services, many=True)
-        return Response(serializer.data)
+        return Response(service_rows.serialize(services))
 
+    @idempotent
     def post(self, request):
         serializer = ServiceSerializer(data=request.data)
         if serializer.is_valid():
@@ -376,21 +500,16 @@ class ServiceDetail(APIView):
     def get_object(self, pk):
         return get_object_or_404(Service, pk=pk)
 
+    @cache_response(Service, User)
     def get(self, request, pk):
-        service = self.get_object(pk)
+        service, archived = get_listing(Service, pk)
         serializer = ServiceSerializer(service)
-        return Response(serializer.data)
+        if archived:
+            return Response({**serializer.data, 'archived': True})
+        return Response(serializer.data, headers={'ETag': etag(service)})
 
     def put(self, request, pk):
-        service = self.get_object(pk)
-        serializer = ServiceSerializer(service, data=request.data, partial=True)
-        if serializer.is_valid():
-            if service.user != request.user:
-                return Response({'error': 'You do not have permission to update this service'}, 
-                              status=status.HTTP_403_FORBIDDEN)
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return update_listing(request, Service, ServiceSerializer, pk, 'service')
 
     def delete(self, request, pk):
         service = self.get_object(pk)
@@ -403,11 +522,14 @@ class ServiceDetail(APIView):
 class VideoList(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @cache_response(Video, User)
     def get(self, request):
+        if 'ids' in request.query_params:
+            return multi_get(request, Video, video_rows)
         videos = Video.objects.all()
-        serializer = VideoSerializer(videos, many=True)
-        return Response(serializer.data)
+        return Response(video_rows.serialize(videos))
 
+    @idempotent
     def post(self, request):
         serializer = VideoSerializer(data=request.data)
         if serializer.is_valid():
@@ -419,23 +541,16 @@ class VideoDetail(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get_object(self, pk):
-        return get_object_or_404(Video, pk=pk)
+        return get_object_or_404(Video.objects.select_related('metadata'), pk=pk)
 
+    @cache_response(Video, User)
     def get(self, request, pk):
         video = self.get_object(pk)
         serializer = VideoSerializer(video)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': etag(video)})
 
     def put(self, request, pk):
-        video = self.get_object(pk)
-        serializer = VideoSerializer(video, data=request.data, partial=True)
-        if serializer.is_valid():
-            if video.user != request.user:
-                return Response({'error': 'You do not have permission to update this video'}, 
-                              status=status.HTTP_403_FORBIDDEN)
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return update_listing(request, Video, VideoSerializer, pk, 'video')
 
     def delete(self, request, pk):
         video = self.get_object(pk)
@@ -445,9 +560,252 @@ class VideoDetail(APIView):
         video.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+class SimilarListings(APIView):
+    """Listings most like the one at ``pk``; ``?limit=`` caps the count (default 10, max 50)."""
+    model = None
+    rows = None
+
+    def get(self, request, pk):
+        from . import similarity  # Deferred so web workers only load numpy when it's needed
+
+        get_object_or_404(self.model, pk=pk)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        ranked = similarity.similar(self.model, pk, limit)
+        listings = {row['id']: row for row in self.rows.serialize(self.model.objects.filter(pk__in=ranked))}
+        return Response([listings[pk] for pk in ranked if pk in listings])
+
+class ProductSimilar(SimilarListings):
+    model = Product
+    rows = product_rows
+
+class LandSimilar(SimilarListings):
+    model = Land
+    rows = land_rows
+
+class ServiceSimilar(SimilarListings):
+    model = Service
+    rows = service_rows
+
+class Autocomplete(APIView):
+    """Listing titles matching ``?q=``, tolerating typos; ``?limit=`` defaults to 8 (max 20)."""
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        query = request.query_params.get('q', '')[:100]
+        if not query.strip():
+            return Response([])
+        return Response(autocomplete.get_index().suggest(query, limit))
+
+class PriceHistory(APIView):
+    """Price chart for a listing from the rollups; ``?start=`` and ``?end=`` are ISO dates."""
+    model = None
+    max_points = 180
+
+    def get(self, request, pk):
+        get_object_or_404(self.model, pk=pk)
+        query = PriceHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end = query.validated_data['start'], query.validated_data['end']
+        period, before, buckets = PriceRollup.series(
+            PricePoint.kind_for(self.model), pk, start, end, self.max_points,
+        )
+        serializer = PriceHistorySerializer({
+            'start': start, 'end': end, 'period': period, 'price_before_start': before, 'buckets': buckets,
+        })
+        return Response(serializer.data)
+
+class ProductPriceHistory(PriceHistory):
+    model = Product
+
+class LandPriceHistory(PriceHistory):
+    model = Land
+
+class SavedSearchList(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        searches = SavedSearch.objects.filter(user=request.user.pk)
+        serializer = SavedSearchSerializer(searches, many=True)
+        return Response(serializer.data)
+
+    @idempotent
+    def post(self, request):
+        if SavedSearch.objects.filter(user=request.user.pk).count() >= SavedSearch.MAX_PER_USER:
+            return Response({'error': f'You can save at most {SavedSearch.MAX_PER_USER} searches'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = SavedSearchSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save(user_id=request.user.pk)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class SavedSearchDetail(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, pk):
+        search = get_object_or_404(SavedSearch, pk=pk, user=request.user.pk)
+        search.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class UserAlerts(APIView):
+    """Queued saved-search alerts, newest first; POST marks them all seen."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        alerts = SearchAlert.objects.filter(user=request.user.pk)
+        if request.query_params.get('unseen'):
+            alerts = alerts.filter(seen_at__isnull=True)
+        serializer = SearchAlertSerializer(alerts.order_by('-pk')[:100], many=True)
+        return Response(serializer.data)
+
+    def post(self, request):
+        seen = SearchAlert.objects.filter(user=request.user.pk, seen_at__isnull=True).update(seen_at=timezone.now())
+        return Response({'seen': seen})
+
+class UploadList(APIView):
+    """Open a resumable image upload; the protocol is described in core/uploads.py."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        open_uploads = ChunkedUpload.objects.filter(user=request.user.pk, expires_at__gt=timezone.now())
+        if open_uploads.count() >= ChunkedUpload.MAX_OPEN_PER_USER:
+            return Response({'error': f'You can have at most {ChunkedUpload.MAX_OPEN_PER_USER} uploads open'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = ChunkedUploadSerializer(data=request.data)
+        if serializer.is_valid():
+            upload = uploads.open_upload(request.user, **serializer.validated_data)
+            return Response(ChunkedUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class UploadDetail(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self, request, pk):
+        return get_object_or_404(ChunkedUpload, pk=pk, user=request.user.pk, expires_at__gt=timezone.now())
+
+    def progress(self, upload, **kwargs):
+        return Response(ChunkedUploadSerializer(upload).data, headers={'Upload-Offset': str(upload.offset)}, **kwargs)
+
+    def get(self, request, pk):
+        return self.progress(self.get_object(request, pk))
+
+    def put(self, request, pk):
+        """Append the request body, which starts at the Upload-Offset header."""
+        upload = self.get_object(request, pk)
+        if not request.META.get('CONTENT_LENGTH'):
+            # Chunked transfer encoding: we can't check the size up front.
+            return Response({'error': 'Content-Length header is required'},
+                            status=status.HTTP_411_LENGTH_REQUIRED)
+        try:
+            offset = int(request.META[uploads.OFFSET_HEADER])
+            length = int(request.META['CONTENT_LENGTH'])
+        except (KeyError, ValueError):
+            return Response({'error': 'Upload-Offset and Content-Length headers are required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            uploads.write_chunk(upload, offset, request.stream, length)
+        except uploads.ChunkError as e:
+            upload.refresh_from_db(fields=['offset'])
+            return Response({'error': str(e), 'offset': upload.offset}, status=e.status,
+                            headers={'Upload-Offset': str(upload.offset)})
+        return self.progress(upload)
+
+    def delete(self, request, pk):
+        self.get_object(request, pk).discard()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class UploadAttach(APIView):
+    """Make a finished upload the image of one of the caller's listings."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        get_object_or_404(ChunkedUpload, pk=pk, user=request.user.pk)
+        serializer = UploadAttachSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        kind = serializer.validated_data['kind']
+        with transaction.atomic():
+            # Locked, so a concurrent attach of the same upload waits here and
+            # then finds it gone rather than its file.
+            upload = get_object_or_404(ChunkedUpload.objects.select_for_update(), pk=pk, user=request.user.pk)
+            if not upload.complete:
+                return Response({'error': 'The upload is not complete', 'offset': upload.offset},
+                                status=status.HTTP_409_CONFLICT)
+            listing = get_object_or_404(ChunkedUpload.KINDS[kind].objects.select_for_update(),
+                                        pk=serializer.validated_data['id'])
+            if listing.user_id != request.user.pk:
+                return Response({'error': 'You do not have permission to update this listing'},
+                                status=status.HTTP_403_FORBIDDEN)
+            if not if_match(request, listing):
+                return Response({'error': 'This listing has been changed since you loaded it', 'version': listing.version},
+                                status=status.HTTP_412_PRECONDITION_FAILED, headers={'ETag': etag(listing)})
+            if not uploads.is_image(upload.path):
+                upload.discard()
+                return Response({'error': 'The upload is not a valid image'}, status=status.HTTP_400_BAD_REQUEST)
+            uploads.attach(upload, listing)
+        return Response({'kind': kind, 'id': listing.pk, 'image': listing.image.url, 'version': listing.version},
+                        headers={'ETag': etag(listing)})
+
+class OrderList(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        orders = Order.objects.filter(user=request.user.pk).prefetch_related('lines')
+        serializer = OrderSerializer(orders, many=True)
+        return Response(serializer.data)
+
+    @idempotent
+    def post(self, request):
+        serializer = OrderCreateSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                order = Order.reserve(request.user, serializer.get_lines())
+            except OutOfStock as e:
+                logger.info(f"Order rejected for user {request.user.pk}: {e}")
+                return Response({
+                    'error': 'Not enough stock',
+                    'item_type': e.item_type,
+                    'item_id': e.item_id,
+                }, status=status.HTTP_409_CONFLICT)
+            return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class OrderDetail(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self, request, pk):
+        return get_object_or_404(Order, pk=pk, user=request.user.pk)
+
+    def get(self, request, pk):
+        order = self.get_object(request, pk)
+        serializer = OrderSerializer(order)
+        return Response(serializer.data)
+
+class OrderConfirm(OrderDetail):
+    def post(self, request, pk):
+        order = self.get_object(request, pk)
+        if not order.confirm():
+            return Response({'error': 'Only unexpired reservations can be confirmed'},
+                          status=status.HTTP_409_CONFLICT)
+        return Response(OrderSerializer(order).data)
+
+class OrderCancel(OrderDetail):
+    def post(self, request, pk):
+        order = self.get_object(request, pk)
+        if not order.release():
+            return Response({'error': 'Only reserved orders can be cancelled'},
+                          status=status.HTTP_409_CONFLICT)
+        return Response(OrderSerializer(order).data)
+
 class CategoryList(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @cache_response(Category)
     def get(self, request):
         categories = Category.objects.all()
         serializer = CategorySerializer(categories, many=True)
@@ -459,6 +817,7 @@ class CategoryDetail(APIView):
     def get_object(self, pk):
         return get_object_or_404(Category, pk=pk)
 
+    @cache_response(Category)
     def get(self, request, pk):
         category = self.get_object(pk)
         serializer = CategorySerializer(category)
@@ -468,6 +827,8 @@ class VideoYouTubeSearch(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get(self, request):
+        import requests  # Deferred: only this view talks to YouTube directly
+
         query = request.query_params.get('q', 'agriculture')
         url = 'https://www.googleapis.com/youtube/v3/search'
         params = {
@@ -481,18 +842,6 @@ class VideoYouTubeSearch(APIView):
         if response.status_code == 200:
             return Response(response.json())
         return Response({'error': 'Failed to fetch YouTube videos'}, status=response.status_code)
-    
-
-
-
-# core/views.py
-from django.middleware.csrf import get_token
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
-import logging
-
-logger = logging.getLogger(__name__)
 
 class CsrfTokenView(APIView):
     def get(self, request):
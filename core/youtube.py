@@ -0,0 +1,120 @@
+# core/youtube.py
+import re
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import response_cache
+from .models import Video, VideoMetadata
+
+BATCH_SIZE = 50  # Most ids the YouTube Data API accepts per videos.list call
+DURATION_RE = re.compile(r'^P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$')
+
+
+def parse_duration(value):
+    """Convert an ISO 8601 duration such as ``PT4M13S`` to seconds."""
+    match = DURATION_RE.match(value or '')
+    if not match:
+        return None
+    parts = {name: int(part or 0) for name, part in match.groupdict().items()}
+    return ((parts['days'] * 24 + parts['hours']) * 60 + parts['minutes']) * 60 + parts['seconds']
+
+
+class YouTubeDataClient:
+    """Fetches video details from the YouTube Data API v3."""
+    url = 'https://www.googleapis.com/youtube/v3/videos'
+
+    def __init__(self, api_key=None, timeout=10):
+        self.api_key = api_key or settings.YOUTUBE_API_KEY
+        self.timeout = timeout
+
+    def fetch(self, video_ids):
+        """Return ``{youtube_video_id: details}`` for up to 50 ids.
+
+        Ids YouTube doesn't know about are left out of the result.
+        """
+        import requests  # Deferred so web workers never load it
+
+        response = requests.get(self.url, params={
+            'part': 'snippet,contentDetails,statistics',
+            'id': ','.join(video_ids),
+            'key': self.api_key,
+            'maxResults': BATCH_SIZE,
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        details = {}
+        for item in response.json().get('items', []):
+            thumbnails = item.get('snippet', {}).get('thumbnails', {})
+            thumbnail = thumbnails.get('high') or thumbnails.get('medium') or thumbnails.get('default') or {}
+            view_count = item.get('statistics', {}).get('viewCount')
+            details[item['id']] = {
+                'thumbnail_url': thumbnail.get('url', ''),
+                'duration_seconds': parse_duration(item.get('contentDetails', {}).get('duration')),
+                'view_count': int(view_count) if view_count is not None else None,
+            }
+        return details
+
+
+class FakeYouTubeClient:
+    """Offline stand-in that makes up deterministic details for every id."""
+
+    def __init__(self):
+        self.calls = []
+
+    def fetch(self, video_ids):
+        self.calls.append(list(video_ids))
+        return {
+            video_id: {
+                'thumbnail_url': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg',
+                'duration_seconds': 60 + len(video_id),
+                'view_count': 1000 * len(video_id),
+            }
+            for video_id in video_ids
+        }
+
+
+def get_client():
+    return import_string(settings.YOUTUBE_METADATA_CLIENT)()
+
+
+def refresh_metadata(client=None, max_age=None, force=False):
+    """Fetch metadata for videos that have none or whose copy is stale.
+
+    Each distinct YouTube id is requested once, in batches of BATCH_SIZE.
+    Returns the number of Video rows updated.
+    """
+    client = client or get_client()
+    now = timezone.now()
+    videos = Video.objects.all()
+    if not force:
+        if max_age is None:
+            max_age = settings.YOUTUBE_METADATA_MAX_AGE
+        cutoff = now - max_age
+        videos = videos.filter(Q(metadata__isnull=True) | Q(metadata__fetched_at__lt=cutoff))
+    pks_by_youtube_id = {}
+    for pk, youtube_video_id in videos.values_list('pk', 'youtube_video_id').iterator():
+        pks_by_youtube_id.setdefault(youtube_video_id, []).append(pk)
+
+    youtube_ids = sorted(pks_by_youtube_id)
+    updated = 0
+    for start in range(0, len(youtube_ids), BATCH_SIZE):
+        batch = youtube_ids[start:start + BATCH_SIZE]
+        details = client.fetch(batch)
+        rows = []
+        for youtube_video_id in batch:
+            found = details.get(youtube_video_id)
+            for pk in pks_by_youtube_id[youtube_video_id]:
+                rows.append(VideoMetadata(video_id=pk, available=found is not None, fetched_at=now, **(found or {})))
+        VideoMetadata.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['video'],
+            update_fields=['available', 'thumbnail_url', 'duration_seconds', 'view_count', 'fetched_at'],
+        )
+        # bulk_create skips the signals that normally expire cached responses.
+        for row in rows:
+            response_cache.invalidate(Video, row.video_id)
+        updated += len(rows)
+    return updated
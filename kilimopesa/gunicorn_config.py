@@ -0,0 +1,97 @@
+"""
+Gunicorn config for kilimopesa.
+
+Usage: gunicorn -c python:kilimopesa.gunicorn_config
+(or `python manage.py serve`, which picks the app module for the profile).
+
+Workers and threads are sized from the CPU count for the profile chosen with
+WEB_PROFILE:
+
+  sync     2 * CPUs + 1 single-threaded workers (gunicorn's own advice)
+  gthread  CPUs + 1 workers with WEB_THREADS threads each (default 4), for
+           I/O-bound traffic such as SMTP and YouTube calls
+  asgi     CPUs + 1 uvicorn workers serving kilimopesa.asgi (needs uvicorn)
+
+WEB_CONCURRENCY, WEB_THREADS, WEB_MAX_REQUESTS and WEB_TIMEOUT override the
+defaults; WEB_BIND/PORT set the listen address and WEB_ACCESS_LOG='' turns
+off access logging.
+"""
+import gc
+import multiprocessing
+import os
+
+PROFILES = ('sync', 'gthread', 'asgi')
+
+
+def tune(profile, cpus=None, environ=os.environ):
+    """Return gunicorn settings for ``profile`` as a dict."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile {profile!r}; expected one of {', '.join(PROFILES)}")
+    cpus = cpus or multiprocessing.cpu_count()
+    if profile == 'sync':
+        workers, threads, worker_class = 2 * cpus + 1, 1, 'sync'
+    elif profile == 'gthread':
+        workers, threads, worker_class = cpus + 1, int(environ.get('WEB_THREADS', 4)), 'gthread'
+    else:
+        workers, threads, worker_class = cpus + 1, 1, 'uvicorn.workers.UvicornWorker'
+    max_requests = int(environ.get('WEB_MAX_REQUESTS', 1000))
+    return {
+        'wsgi_app': 'kilimopesa.asgi:application' if profile == 'asgi' else 'kilimopesa.wsgi:application',
+        'worker_class': worker_class,
+        'workers': int(environ.get('WEB_CONCURRENCY', workers)),
+        'threads': threads,
+        # Recycle workers to cap slow leaks; the jitter keeps them from all
+        # restarting at the same moment.
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests // 10,
+        'timeout': int(environ.get('WEB_TIMEOUT', 30)),
+        'keepalive': 5,
+        # Load Django once in the master so workers share its pages copy-on-write.
+        'preload_app': True,
+    }
+
+
+_settings = tune(os.environ.get('WEB_PROFILE', 'gthread'))
+wsgi_app = _settings['wsgi_app']
+worker_class = _settings['worker_class']
+workers = _settings['workers']
+threads = _settings['threads']
+max_requests = _settings['max_requests']
+max_requests_jitter = _settings['max_requests_jitter']
+timeout = _settings['timeout']
+keepalive = _settings['keepalive']
+preload_app = _settings['preload_app']
+bind = os.environ.get('WEB_BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-') or None
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported and before any
+    # worker forks: finish the lazy work every worker would otherwise repeat.
+    from django.db import connections
+    from django.urls import get_resolver
+
+    from core import autocomplete
+
+    get_resolver().url_patterns
+    autocomplete.get_index()
+    # Workers must never inherit a database connection from the master.
+    connections.close_all()
+    # Keep the shared objects out of the collector so the first collection in
+    # a worker doesn't dirty (and copy) every page they live on.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from django.db import connections
+
+    from core import autocomplete
+
+    connections.close_all()
+    autocomplete.reschedule()
+
+
+def worker_exit(server, worker):
+    from django.db import connections
+
+    connections.close_all()